@@ -0,0 +1,70 @@
+"""Compare the distinct-count kernel with pandas groupby-nunique.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_distinct main_data.csv --repeat 10
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import helpers
+from data_loader import load_all_df
+
+# helper name -> (group column, id column), as the pandas version wrote them.
+CASES = {
+    "create_by_customer_city": ("customer_city", "customer_id"),
+    "create_by_customer_state": ("customer_state", "customer_id"),
+    "create_by_payment_sequential": ("payment_sequential", "order_id"),
+    "create_by_payment_type": ("payment_type", "order_id"),
+    "create_by_payment_installment": ("payment_installments", "order_id"),
+    "create_by_review": ("review_score", "order_id"),
+    "create_by_order_status": ("order_status", "order_id"),
+    "create_by_seller_city": ("seller_city", "seller_id"),
+    "create_by_seller_state": ("seller_state", "seller_id")
+}
+
+
+def pandas_reference(df, by, column, name):
+    result = df.groupby(by=by, observed=True)[column].nunique()
+    if name != "create_by_review":
+        result = result.sort_values(ascending=False)
+    return helpers.drop_categories(result.reset_index(), by)
+
+
+def best_of(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--repeat", type=int, default=1, help="stack the data this many times")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    df = load_all_df(args.path)
+    if args.repeat > 1:
+        df = pd.concat([df] * args.repeat, ignore_index=True)
+    print(f"{len(df)} rows")
+
+    rows = []
+    for name, (by, column) in CASES.items():
+        helper = getattr(helpers, name)
+        pd.testing.assert_frame_equal(helper(df), pandas_reference(df, by, column, name))
+        before = best_of(lambda: pandas_reference(df, by, column, name), args.rounds)
+        after = best_of(lambda: helper(df), args.rounds)
+        rows.append((name, before * 1000, after * 1000, before / after))
+
+    report = pd.DataFrame(rows, columns=["helper", "pandas_ms", "kernel_ms", "speedup"])
+    print(report.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
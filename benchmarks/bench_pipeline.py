@@ -0,0 +1,248 @@
+"""Time every stage of the dashboard's data path, headlessly.
+
+For each scale, Olist-shaped data is generated once (see benchmarks.synthetic)
+and then loaded, filtered, aggregated and drawn the way dashboard.py does,
+without a Streamlit server. Each stage records wall time, resident memory
+(peak and change) and the bytes allocated through Python's allocator, and
+the whole run is written as JSON so results from two versions can be diffed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --rows 100000 1000000 --output bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import charts
+import helpers
+from benchmarks.synthetic import generate
+from cube import build_daily_cube
+from data_loader import cache_paths, read_cache, read_source_csv, slice_dates, write_cache
+from executor import compute_metrics
+from ingest import CHUNK_ROWS, ingest_csv, iter_months, read_range, store_dir
+from lazy import TAB_METRICS
+from planner import METRIC_COLUMNS, metric_columns
+from report import section_charts
+from rfm_engine import RFMIndex, RFMWindow, concat_rows, rfm_rows
+from timeseries import GRANULARITIES, TimeSeries, daily_totals
+
+HELPERS = [name for name in dir(helpers) if name.startswith("create_")]
+
+# Date ranges measured at every scale, as days back from the last purchase;
+# None is the dashboard's default full range.
+RANGES = {"full": None, "90d": 90, "7d": 7}
+
+
+def read_status(field):
+    # VmRSS / VmHWM in MB from /proc, or None where there is no /proc.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Linux lets a process reset its own high-water mark; elsewhere the peak
+    # is the process-wide one and only grows.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    peak = read_status("VmHWM")
+    if peak is None:
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale / 1024
+    return peak
+
+
+class Recorder:
+
+    def __init__(self, trace_allocations):
+        self.trace_allocations = trace_allocations
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        gc.collect()
+        reset_peak_rss()
+        rss_before = read_status("VmRSS")
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        wall = time.perf_counter() - start
+        record = {"stage": name, "wall_s": wall, "peak_rss_mb": peak_rss()}
+        rss_after = read_status("VmRSS")
+        if rss_before is not None and rss_after is not None:
+            record["rss_delta_mb"] = rss_after - rss_before
+            record["peak_rss_over_start_mb"] = record["peak_rss_mb"] - rss_before
+        if self.trace_allocations:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            record["alloc_peak_mb"] = (traced_peak - traced_before) / 2**20
+            record["alloc_net_mb"] = (traced - traced_before) / 2**20
+        self.stages.append(record)
+
+
+def chart_jobs(results, rfm, series):
+    # The charts one full pass over the three tabs draws, built exactly as
+    # dashboard.py builds them.
+    jobs = {}
+    for section in TAB_METRICS:
+        jobs.update(section_charts(section, results, rfm, series))
+    return jobs
+
+
+def run_scale(path, recorder, skip_helpers=False, skip_charts=False, ingest_chunks=(CHUNK_ROWS,)):
+    stage = recorder.stage
+    cache_path = cache_paths(path)[0]
+
+    with stage("load:csv_parse_sort"):
+        df = read_source_csv(path)
+    with stage("load:feather_write"):
+        write_cache(df, cache_path)
+    del df
+    with stage("load:feather_mmap"):
+        df = read_cache(cache_path)
+    # The store is streamed in chunks, so its peak should follow the chunk
+    # size rather than the row count; each size gets its own stage.
+    for chunksize in ingest_chunks:
+        with stage(f"load:ingest_store[chunks={chunksize}]"):
+            ingest_csv(path, chunksize=chunksize)
+    store = store_dir(path)
+    with stage("prepare:store_rfm_index"):
+        RFMIndex(concat_rows(rfm_rows(month) for month in iter_months(store, METRIC_COLUMNS["rfm"])))
+    with stage("prepare:daily_cube"):
+        cube = build_daily_cube(df)
+    with stage("prepare:rfm_index"):
+        rfm_index = RFMIndex(rfm_rows(df))
+    with stage("prepare:timeseries"):
+        timeseries = TimeSeries(*daily_totals(df))
+
+    last_day = df['order_purchase_timestamp'].max().normalize()
+    first_day = df['order_purchase_timestamp'].min().normalize()
+    for label, days in RANGES.items():
+        start_date = first_day if days is None else last_day - pd.Timedelta(days=days - 1)
+        start_date, end_date = start_date.date(), last_day.date()
+
+        with stage(f"filter[{label}]:slice"):
+            filtered = slice_dates(df, start_date, end_date)
+        with stage(f"filter[{label}]:store_read"):
+            read_range(store, start_date, end_date, metric_columns(list(METRIC_COLUMNS)))
+
+        if not skip_helpers:
+            for name in HELPERS:
+                with stage(f"helper[{label}]:{name}"):
+                    getattr(helpers, name)(filtered)
+
+        results = {}
+        for tab, names in TAB_METRICS.items():
+            with stage(f"metrics[{label}]:{tab}"):
+                results.update(compute_metrics(filtered, names, cube, start_date, end_date, workers=1))
+        for granularity in GRANULARITIES:
+            with stage(f"metrics[{label}]:series_{granularity.lower()}"):
+                timeseries.window(start_date, end_date, granularity)
+        with stage(f"metrics[{label}]:rfm_window"):
+            rfm = RFMWindow(rfm_index).summary(start_date, end_date)
+
+        if not skip_charts and len(filtered):
+            series = timeseries.window(start_date, end_date)
+            for name, (draw, frames, params) in chart_jobs(results, rfm, series).items():
+                with stage(f"chart[{label}]:{name}"):
+                    charts.render(draw, *frames, **params)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "dashboard-bench"))
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--no-alloc", action="store_true", help="skip tracemalloc, which slows Python-heavy stages")
+    parser.add_argument("--skip-helpers", action="store_true", help="skip the one-function-per-metric helpers")
+    parser.add_argument("--skip-charts", action="store_true")
+    parser.add_argument("--ingest-chunks", type=int, nargs="+", default=[CHUNK_ROWS // 5, CHUNK_ROWS],
+                        help="ingest the store once per chunk size, to compare their peak memory")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    # Render every chart for real instead of serving repeats from the cache.
+    charts.chart_cache = charts.ChartCache(0)
+    if not args.no_alloc:
+        tracemalloc.start()
+
+    runs = []
+    for rows in args.rows:
+        path = os.path.join(args.data_dir, f"synthetic_{rows}_{args.seed}.csv")
+        generated = None
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            generate(path, rows, args.seed)
+            generated = time.perf_counter() - start
+        recorder = Recorder(trace_allocations=not args.no_alloc)
+        run_scale(path, recorder, args.skip_helpers, args.skip_charts, args.ingest_chunks)
+        ingest_peaks = {
+            record["stage"][len("load:ingest_store[chunks="):-1]: record.get("peak_rss_over_start_mb")
+            for record in recorder.stages if record["stage"].startswith("load:ingest_store[")
+        }
+        runs.append({"rows": rows, "path": path, "generate_s": generated, "stages": recorder.stages,
+                     "ingest_peak_rss_over_start_mb": ingest_peaks})
+
+        report = pd.DataFrame(recorder.stages).set_index("stage")
+        print(f"\n{rows} rows", file=sys.stderr)
+        print(report.round(3).to_string(), file=sys.stderr)
+        peaks = [ingest_peaks[size] for size in sorted(ingest_peaks, key=int) if ingest_peaks[size] is not None]
+        if len(peaks) > 1 and peaks != sorted(peaks):
+            print(f"warning: ingest peak memory does not grow with the chunk size: {ingest_peaks}", file=sys.stderr)
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "trace_allocations": not args.no_alloc
+        },
+        "runs": runs
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
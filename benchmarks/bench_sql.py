@@ -0,0 +1,142 @@
+"""Compare the SQL backend with the pandas path over the same date ranges.
+
+For each scale, Olist-shaped data is generated once (see benchmarks.synthetic),
+ingested into the month-partitioned store and mirrored as Parquet. Every
+planner metric is then computed both ways: by reading the range's columns
+from the store into pandas, and as DuckDB queries over the Parquet mirror.
+Both results are checked to agree, row order included, before they are timed, and wall time and
+peak resident memory of each stage are written as JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sql --rows 1000000 10000000 --output bench_sql.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import sql_backend
+from benchmarks.bench_pipeline import RANGES, Recorder, git_revision
+from benchmarks.synthetic import generate
+from cube import CUBE_METRICS
+from ingest import ingest_csv, read_range, store_dir
+from planner import METRICS, compute_metrics, metric_columns
+
+
+def plain(value):
+    # Categories come back from SQL as plain values.
+    return value.astype({column: object for column in value.columns
+                         if isinstance(value[column].dtype, pd.CategoricalDtype)})
+
+
+def tie_break(name, value):
+    # SQL breaks ties in the count-sorted breakdowns by label, where the
+    # pandas path leaves them in any order; a stable sort gives pandas the
+    # same tie-break. It only moves rows within ties, so a result whose
+    # counts were out of order still fails.
+    if name not in CUBE_METRICS or not CUBE_METRICS[name][1]:
+        return value
+    label, count = value.columns
+    tied = value.sort_values([count, label], ascending=[False, True], kind="stable").reset_index(drop=True)
+    assert (tied[count].to_numpy() == value[count].to_numpy()).all(), f"{name}: not sorted by {count}"
+    return tied
+
+
+def check_equal(name, expected, actual):
+    if isinstance(expected, pd.DataFrame):
+        # Row order is part of the result: the dashboard charts the head
+        # and tail of each breakdown as they come.
+        pd.testing.assert_frame_equal(tie_break(name, plain(expected)).reset_index(drop=True),
+                                      plain(actual[expected.columns]).reset_index(drop=True),
+                                      check_dtype=False, check_exact=False, rtol=1e-9, obj=name)
+    elif isinstance(expected, dict):
+        for key in expected:
+            check_equal(f"{name}.{key}", expected[key], actual[key])
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, actual, check_dtype=False, obj=name)
+    elif not np.isclose(expected, actual, equal_nan=True):
+        raise AssertionError(f"{name}: {expected!r} != {actual!r}")
+
+
+def run_scale(path, recorder, validate=True):
+    stage = recorder.stage
+    names = list(METRICS)
+    columns = metric_columns(names)
+
+    with stage("load:ingest_store"):
+        meta, _ = ingest_csv(path)
+    with stage("load:sync_parquet"):
+        _, directory = sql_backend.sync_parquet(path)
+    with stage("load:resync_parquet"):
+        sql_backend.sync_parquet(path)
+    store = store_dir(path)
+
+    first_day = pd.Timestamp(meta['min_timestamp']).normalize()
+    last_day = pd.Timestamp(meta['max_timestamp']).normalize()
+    for label, days in RANGES.items():
+        start_date = first_day if days is None else last_day - pd.Timedelta(days=days - 1)
+        start_date, end_date = start_date.date(), last_day.date()
+
+        with stage(f"pandas[{label}]"):
+            expected = compute_metrics(read_range(store, start_date, end_date, columns), names)
+        with stage(f"sql[{label}]"):
+            actual = sql_backend.compute_metrics(directory, names, start_date, end_date)
+        if validate:
+            for name in names:
+                check_equal(name, expected[name], actual[name])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "dashboard-bench"))
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--no-validate", action="store_true", help="time both paths without comparing results")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    runs = []
+    for rows in args.rows:
+        path = os.path.join(args.data_dir, f"synthetic_{rows}_{args.seed}.csv")
+        if not os.path.exists(path):
+            generate(path, rows, args.seed)
+        recorder = Recorder(trace_allocations=False)
+        run_scale(path, recorder, validate=not args.no_validate)
+        runs.append({"rows": rows, "path": path, "stages": recorder.stages})
+
+        report = pd.DataFrame(recorder.stages).set_index("stage")
+        print(f"\n{rows} rows", file=sys.stderr)
+        print(report.round(3).to_string(), file=sys.stderr)
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "duckdb": getattr(sql_backend.duckdb, "__version__", None),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sql_threads": config.SQL_THREADS or None,
+            "validated": not args.no_validate
+        },
+        "runs": runs
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Check that appending rows to the CSV extends the cached dataset exactly.
+
+Half of the CSV is loaded as the dataset the dashboard shares (frame, daily
+cube, RFM index, time series); the rest is appended in steps cut in the
+middle of orders and in the middle of a line, as if a writer were still
+appending it, and last the uneven rows of check_cube, whose customer_id
+recurs on another day. After each step, load_dataset merges only the new rows
+into the previous dataset. The merged frame must equal read_source_csv of
+the longer file, and every structure must answer random date ranges
+exactly like one built from scratch from the whole lines written so far.
+
+Run from the repository root:
+
+    python -m benchmarks.check_append main_data.csv --appends 3
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.check_cube import check_cube, random_ranges, uneven_rows
+from benchmarks.check_store import check_rfm_index, check_series
+from data_loader import appended_since, read_source_csv
+from dataset import build_dataset, load_dataset
+
+
+def check_step(dataset, path, label, ranges_count, rng):
+    expected = build_dataset(read_source_csv(path), None)
+    df = expected["df"]
+    pd.testing.assert_frame_equal(dataset["df"], df, obj=f"{label} frame")
+    timestamps = df['order_purchase_timestamp']
+    ranges = random_ranges(rng, timestamps.min().normalize(), timestamps.max().normalize(), ranges_count)
+
+    check_cube(dataset["cube"], df, ranges, label)
+    check_series(dataset["timeseries"], expected["timeseries"], ranges, label)
+    check_rfm_index(dataset["rfm_index"], expected["rfm_index"], label)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--appends", type=int, default=3)
+    parser.add_argument("--ranges", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with open(args.path, "rb") as f:
+        lines = f.readlines()
+    cuts = np.linspace(len(lines) // 2, len(lines), args.appends + 1).astype(int)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "main_data.csv")
+        whole = os.path.join(directory, "whole.csv")
+        with open(path, "wb") as f:
+            f.writelines(lines[:cuts[0]])
+        dataset = load_dataset(path)
+        check_step(dataset, path, f"load ({cuts[0] - 1} rows)", args.ranges, rng)
+        written = 0
+        for step, (start, stop) in enumerate(zip(cuts[:-1], cuts[1:]), 1):
+            # Each step finishes the line the last one left half written.
+            partial = lines[stop][:len(lines[stop]) // 2] if stop < len(lines) else b""
+            with open(path, "ab") as f:
+                f.write(lines[start][written:])
+                f.writelines(lines[start + 1:stop])
+                f.write(partial)
+            written = len(partial)
+            # Otherwise load_dataset would quietly rebuild, and pass.
+            assert appended_since(path, dataset["meta"])
+            dataset = load_dataset(path, dataset)
+            with open(whole, "wb") as f:
+                f.writelines(lines[:stop])
+            check_step(dataset, whole, f"append {step} ({stop - 1} rows)", args.ranges, rng)
+        with open(path, "ab") as f:
+            f.write(uneven_rows(args.path))
+        dataset = load_dataset(path, dataset)
+        check_step(dataset, path, "append uneven rows", args.ranges, rng)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Check the daily cube against the pandas helpers over random date ranges.
+
+The cube is built twice, from the loaded frame and by streaming the CSV
+into the store in small chunks, and every breakdown it answers must equal
+the matching helpers.create_* function run on the date-filtered rows.
+Both are checked again on a copy of the CSV with two more rows: one without
+a purchase time, and a new order on the last row's day by the customer_id of
+the first row, which then falls on two days.
+
+Run from the repository root:
+
+    python -m benchmarks.check_cube main_data.csv --ranges 50
+"""
+import argparse
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import helpers
+from cube import CUBE_METRICS, build_daily_cube, cube_pair_ids, query_cube
+from data_loader import load_all_df, slice_dates
+from ingest import ingest_csv
+
+
+def plain(df):
+    # Categorical label columns compare by value, whatever their categories.
+    return df.astype({column: df[column].cat.categories.dtype for column in df.columns
+                      if isinstance(df[column].dtype, pd.CategoricalDtype)}).reset_index(drop=True)
+
+
+def random_ranges(rng, first_day, last_day, count):
+    # The whole span, single days and spans of every length in between.
+    days = (last_day - first_day).days
+    ranges = [(first_day, last_day), (first_day, first_day), (last_day, last_day)]
+    for _ in range(count):
+        start, end = np.sort(rng.integers(0, days + 1, 2))
+        ranges.append((first_day + pd.Timedelta(days=int(start)), first_day + pd.Timedelta(days=int(end))))
+    return [(start.date(), end.date()) for start, end in ranges]
+
+
+def check_cube(cube, df, ranges, label):
+    for start_date, end_date in ranges:
+        filtered = slice_dates(df, start_date, end_date)
+        results = query_cube(cube, start_date, end_date)
+        for name in CUBE_METRICS:
+            expected = getattr(helpers, "create_" + name)(filtered)
+            pd.testing.assert_frame_equal(plain(results[name]), plain(expected), check_dtype=False,
+                                          obj=f"{label} {name} {start_date}..{end_date}")
+    print(f"{label}: {len(ranges)} ranges match")
+
+
+def uneven_rows(path):
+    # The two extra CSV lines described above, as bytes.
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        first = next(reader)
+        for last in reader:
+            pass
+    undated, reused = list(last), list(first)
+    undated[header.index('order_purchase_timestamp')] = ""
+    reused[header.index('order_purchase_timestamp')] = last[header.index('order_purchase_timestamp')]
+    reused[header.index('order_id')] = "reused-" + first[header.index('order_id')]
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows([undated, reused])
+    return out.getvalue().encode()
+
+
+def check_file(path, ranges_count, chunksize, seed, label=""):
+    df = load_all_df(path)
+    timestamps = df['order_purchase_timestamp']
+    ranges = random_ranges(np.random.default_rng(seed), timestamps.min().normalize(),
+                           timestamps.max().normalize(), ranges_count)
+
+    check_cube(build_daily_cube(df), df, ranges, label + "frame")
+    with tempfile.TemporaryDirectory() as directory:
+        _, cube = ingest_csv(path, os.path.join(directory, "store"), chunksize=chunksize)
+        check_cube(cube, df, ranges, f"{label}store (chunks of {chunksize})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--ranges", type=int, default=50)
+    parser.add_argument("--chunksize", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_file(args.path, args.ranges, args.chunksize, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "main_data.csv")
+        shutil.copyfile(args.path, path)
+        with open(path, "ab") as f:
+            f.write(uneven_rows(args.path))
+        df = load_all_df(path)
+        assert df['order_purchase_timestamp'].isna().sum() == 1
+        assert cube_pair_ids(build_daily_cube(df)) == {"customer_id"}
+        check_file(path, args.ranges, args.chunksize, args.seed, "uneven rows, ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Check the shared result cache: coalescing, failed computations, eviction
+and the on-disk spill.
+
+Threads ask ResultCache.get_many for overlapping sets of keys while the
+computation is held open, so most of them have to wait on keys another
+thread claimed. Every key must be computed exactly once, and every thread
+must get every value it asked for. If the thread that claimed the keys
+fails, as an interrupted Streamlit rerun does, the waiters must compute
+the keys themselves rather than fail too. Eviction is least recently used
+first within the byte budget and never drops results pinned by the boot
+warm-up. Spilled results must be found by a new cache over the same
+directory.
+
+Run from the repository root:
+
+    python -m benchmarks.check_result_cache --threads 16
+"""
+import argparse
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import warmup
+from result_cache import ResultCache, size_of
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Probe:
+    # A compute function for get_many that counts the keys it was asked for
+    # and can be held open until released.
+
+    def __init__(self, hold=False, fail=False):
+        self.calls = Counter()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, missing):
+        with self._lock:
+            self.calls.update(missing)
+        self.entered.set()
+        self.release.wait()
+        if self.fail:
+            raise Interrupted()
+        return {key: value_of(key) for key in missing}
+
+
+def value_of(key):
+    return b"x" * (100 + key[-1])
+
+
+def run_threads(cache, requests, compute):
+    results, errors = [None] * len(requests), [None] * len(requests)
+
+    def run(i):
+        try:
+            results[i] = cache.get_many(requests[i], compute)
+        except Interrupted as error:
+            errors[i] = error
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def check_values(requests, results):
+    for keys, values in zip(requests, results):
+        assert values is not None and set(values) == set(keys), (keys, values)
+        for key in keys:
+            assert values[key] == value_of(key), key
+
+
+def check_coalescing(n_threads, n_keys):
+    cache = ResultCache(1 << 30)
+    probe = Probe(hold=True)
+    requests = [[("v1", (i + step) % n_keys) for step in range(3)] for i in range(n_threads)]
+    threads, results, _ = run_threads(cache, requests, probe)
+    # Keep the first computations open while the other threads pile up.
+    probe.entered.wait()
+    time.sleep(0.2)
+    probe.release.set()
+    for thread in threads:
+        thread.join()
+
+    check_values(requests, results)
+    assert all(probe.calls[key] == 1 for key in probe.calls) and len(probe.calls) == n_keys, probe.calls
+    print(f"coalescing: {sum(len(keys) for keys in requests)} requested keys, each of {n_keys} computed once")
+
+
+def check_failed_claim(n_threads):
+    cache = ResultCache(1 << 30)
+    keys = [("v1", i) for i in range(4)]
+    failing = Probe(hold=True, fail=True)
+    threads, _, errors = run_threads(cache, [keys], failing)
+    failing.entered.wait()
+
+    retry = Probe()
+    requests = [keys] * n_threads
+    waiters, results, waiter_errors = run_threads(cache, requests, retry)
+    time.sleep(0.2)
+    failing.release.set()
+    for thread in threads + waiters:
+        thread.join()
+
+    assert isinstance(errors[0], Interrupted), errors
+    assert not any(waiter_errors), waiter_errors
+    check_values(requests, results)
+    assert all(retry.calls[key] == 1 for key in keys), retry.calls
+    print(f"failed claim: {n_threads} waiters recomputed each key once and none failed")
+
+
+def check_eviction():
+    entry = size_of(value_of(("v1", 0)))
+    cache = ResultCache(3 * entry + 50)
+    probe = Probe()
+    for key in ["a", "b", "c", "a", "d"]:
+        cache.get(("v1", key, 0), lambda key=key: value_of(("v1", key, 0)))
+    # a was used after b, so d pushed out b.
+    for key in ["a", "c", "d", "b"]:
+        cache.get_many([("v1", key, 0)], probe)
+    assert probe.calls == Counter({("v1", "b", 0): 1}), probe.calls
+    assert cache.size <= cache.max_bytes, (cache.size, cache.max_bytes)
+
+    # A result bigger than the whole budget is handed out but not kept.
+    big = ResultCache(entry - 1)
+    for _ in range(2):
+        big.get_many([("v1", 0)], probe)
+    assert probe.calls[("v1", 0)] == 2 and big.size == 0, probe.calls
+
+    # Warm-up results stay however much else comes in.
+    pinned = ResultCache(2 * entry + 50)
+    token = warmup.active.set(True)
+    try:
+        pinned.get_many([("v1", "warm", 0)], probe)
+    finally:
+        warmup.active.reset(token)
+    for i in range(10):
+        pinned.get_many([("v1", "cold", i % 5)], probe)
+    pinned.get_many([("v1", "warm", 0)], probe)
+    assert probe.calls[("v1", "warm", 0)] == 1, probe.calls
+    print("eviction: least recently used first, oversized results skipped, warm-up results pinned")
+
+
+def check_spill():
+    with tempfile.TemporaryDirectory() as directory:
+        keys = [("v1", i) for i in range(5)]
+        ResultCache(1 << 30, directory, 1 << 30).get_many(keys, Probe())
+        probe = Probe()
+        values = ResultCache(1 << 30, directory, 1 << 30).get_many(keys, probe)
+        assert not probe.calls, probe.calls
+        check_values([keys], [values])
+
+        # The directory is pruned oldest first once it passes its budget;
+        # spaced out so file times are distinct at the filesystem's grain.
+        small = ResultCache(1 << 30, directory, 2000)
+        for i in range(20):
+            time.sleep(0.02)
+            small.get_many([("v2", i)], Probe())
+        probe = Probe()
+        ResultCache(1 << 30, directory, 1 << 30).get_many(keys + [("v2", 19)], probe)
+        assert set(probe.calls) == set(keys), probe.calls
+    print("spill: results found again by a new cache, directory pruned oldest first")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--keys", type=int, default=6)
+    args = parser.parse_args()
+
+    check_coalescing(args.threads, args.keys)
+    check_failed_claim(args.threads)
+    check_eviction()
+    check_spill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Check the incremental RFM window against helpers.create_rfm.
+
+One RFMWindow is walked through a sequence of date ranges: random jumps,
+plus small moves of either edge in both directions, which take the
+incremental paths (folding rows in and out and repairing each customer's
+last purchase from the previous-row links). After every move each
+customer's recency, frequency and monetary value, and the averages and
+top-10 values of the summary, must equal create_rfm on the filtered rows.
+
+Run from the repository root:
+
+    python -m benchmarks.check_rfm main_data.csv --moves 40
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import helpers
+from data_loader import load_all_df, slice_dates
+from distinct import column_codes
+from rfm_engine import RFMIndex, RFMWindow, rfm_rows
+
+
+def range_moves(rng, first_day, last_day, count):
+    # Alternates random ranges with nudges of one or both edges.
+    days = (last_day - first_day).days
+    start, end = 0, days
+    moves = []
+    for step in range(count):
+        if step % 3 == 0:
+            start, end = (int(day) for day in np.sort(rng.integers(0, days + 1, 2)))
+        else:
+            start = int(np.clip(start + rng.integers(-5, 6), 0, days))
+            end = int(np.clip(end + rng.integers(-5, 6), start, days))
+        moves.append((first_day + pd.Timedelta(days=start), first_day + pd.Timedelta(days=end)))
+    return [(start.date(), end.date()) for start, end in moves]
+
+
+def window_rfm(window, customers):
+    # Per-customer values held by the window, labelled like create_rfm.
+    present = np.flatnonzero(window.rows)
+    index = window.index
+    recency = (index.timestamps[window.stop - 1] - index.timestamps[window.last_row[present]]) // (86400 * 10**9)
+    return pd.DataFrame({
+        "customer_unique_id": np.asarray(customers.take(present), dtype=object),
+        "frequency": window.frequency[present],
+        "monetary": window.monetary[present] / 100,
+        "recency": recency
+    })
+
+
+def check_move(window, customers, filtered, start_date, end_date):
+    summary = window.summary(start_date, end_date)
+    expected = helpers.create_rfm(filtered)
+    expected = expected.astype({"customer_unique_id": object}).sort_values("customer_unique_id")
+    actual = window_rfm(window, customers).sort_values("customer_unique_id")
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False, obj=f"rfm {start_date}..{end_date}")
+
+    for column in ["recency", "frequency", "monetary"]:
+        assert np.isclose(summary["average_" + column], expected[column].mean(), equal_nan=True), column
+    tops = {
+        "top_recency": expected["recency"].nsmallest(10),
+        "top_frequency": expected["frequency"].nlargest(10),
+        "top_monetary": expected["monetary"].astype(int).nlargest(10)
+    }
+    for name, values in tops.items():
+        column = name[len("top_"):]
+        np.testing.assert_array_equal(summary[name][column].to_numpy(), values.to_numpy(),
+                                      err_msg=f"{name} {start_date}..{end_date}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--moves", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = load_all_df(args.path)
+    _, customers = column_codes(df['customer_unique_id'])
+    timestamps = df['order_purchase_timestamp']
+    moves = range_moves(np.random.default_rng(args.seed), timestamps.min().normalize(),
+                        timestamps.max().normalize(), args.moves)
+
+    window = RFMWindow(RFMIndex(rfm_rows(df)))
+    for start_date, end_date in moves:
+        check_move(window, customers, slice_dates(df, start_date, end_date), start_date, end_date)
+    print(f"{len(moves)} range moves match create_rfm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Check the month-partitioned store against the frame it stands for.
+
+A prefix of the CSV is ingested in small chunks, so orders straddle chunk
+boundaries, and the rest is appended in steps cut in the middle of orders
+and in the middle of a line, as if a writer were still appending it,
+followed by the uneven rows of check_cube, whose customer_id recurs in another month.
+After the ingest and after every append, the store's cube, time series and
+RFM index must equal the ones built from read_source_csv of its whole lines,
+over random date ranges. The RFM index the dashboard keeps is extended from
+the previous step's, reading only the months that gained part files, and
+must equal one read from every month.
+
+Run from the repository root:
+
+    python -m benchmarks.check_store main_data.csv --appends 2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.check_cube import check_cube, random_ranges, uneven_rows
+from data_loader import read_source_csv
+from dataset import load_store_rfm_index
+from ingest import ingest_csv, iter_months, load_store, read_store_series, store_dir
+from planner import METRIC_COLUMNS
+from rfm_engine import RFMIndex, concat_rows, rfm_rows
+from timeseries import GRANULARITIES, TimeSeries, daily_totals
+
+
+def check_series(series, expected, ranges, label):
+    for start_date, end_date in ranges:
+        for granularity in GRANULARITIES:
+            pd.testing.assert_frame_equal(series.window(start_date, end_date, granularity),
+                                          expected.window(start_date, end_date, granularity),
+                                          obj=f"{label} series {granularity} {start_date}..{end_date}")
+    print(f"{label}: time series match")
+
+
+def check_rfm_index(index, expected, label):
+    pd.testing.assert_index_equal(index.customers, expected.customers, obj=f"{label} customers")
+    for name in ["customer_codes", "timestamps", "cents", "first_of_order", "previous_row", "masked_ids"]:
+        np.testing.assert_array_equal(getattr(index, name), getattr(expected, name), err_msg=f"{label} {name}")
+    print(f"{label}: RFM index matches")
+
+
+def check_step(path, chunksize, state, label, ranges_count, rng, whole=None):
+    # whole holds the lines of path that are complete, if not all of them.
+    meta, cube = load_store(path, chunksize=chunksize)
+    df = read_source_csv(path if whole is None else whole)
+    assert meta["rows"] == len(df), (meta["rows"], len(df))
+    timestamps = df['order_purchase_timestamp']
+    ranges = random_ranges(rng, timestamps.min().normalize(), timestamps.max().normalize(), ranges_count)
+
+    check_cube(cube, df, ranges, label)
+    check_series(TimeSeries(*read_store_series(store_dir(path))), TimeSeries(*daily_totals(df)), ranges, label)
+    months = iter_months(store_dir(path), METRIC_COLUMNS["rfm"])
+    fresh = RFMIndex(concat_rows(rfm_rows(month) for month in months))
+    # The store keeps no rows without a purchase time, which no window reaches.
+    check_rfm_index(fresh, RFMIndex(rfm_rows(df[timestamps.notna()])), label)
+    # Otherwise the index would quietly be read from every month, and pass.
+    assert state is None or state["store_id"] == meta["store_id"]
+    state = load_store_rfm_index(path, state)
+    check_rfm_index(state["index"], fresh, label + " extended")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--appends", type=int, default=2)
+    parser.add_argument("--ranges", type=int, default=20)
+    parser.add_argument("--chunksize", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with open(args.path, "rb") as f:
+        lines = f.readlines()
+    # The first cut keeps half of the rows; each append adds an equal share.
+    cuts = np.linspace(len(lines) // 2, len(lines), args.appends + 1).astype(int)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "main_data.csv")
+        with open(path, "wb") as f:
+            f.writelines(lines[:cuts[0]])
+        ingest_csv(path, chunksize=args.chunksize)
+        state = check_step(path, args.chunksize, None, f"ingest ({cuts[0] - 1} rows)", args.ranges, rng)
+        written = 0
+        for step, (start, stop) in enumerate(zip(cuts[:-1], cuts[1:]), 1):
+            # Each step finishes the line the last one left half written.
+            partial = lines[stop][:len(lines[stop]) // 2] if stop < len(lines) else b""
+            with open(path, "ab") as f:
+                f.write(lines[start][written:])
+                f.writelines(lines[start + 1:stop])
+                f.write(partial)
+            written = len(partial)
+            whole = os.path.join(directory, "whole.csv")
+            with open(whole, "wb") as f:
+                f.writelines(lines[:stop])
+            state = check_step(path, args.chunksize, state, f"append {step} ({stop - 1} rows)", args.ranges, rng,
+                               whole)
+        with open(path, "ab") as f:
+            f.write(uneven_rows(args.path))
+        check_step(path, args.chunksize, state, "append uneven rows", args.ranges, rng)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
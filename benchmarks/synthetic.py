@@ -0,0 +1,173 @@
+"""Generate an Olist-shaped main_data.csv of any size.
+
+Rows are written in chunks, so 50M rows need no more memory than one chunk.
+IDs are derived from running counters, which keeps orders, customers and
+sellers consistent across chunks and makes the output reproducible.
+
+    python -m benchmarks.synthetic /tmp/main_data.csv --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    "order_id", "customer_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+    "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+    "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state",
+    "order_item_id", "product_id", "seller_id", "shipping_limit_date", "price", "freight_value",
+    "payment_sequential", "payment_type", "payment_installments", "payment_value", "review_id",
+    "review_score", "product_category_name", "seller_zip_code_prefix", "seller_city", "seller_state",
+    "delivery_time", "estimated_delivery_time"
+]
+
+STATES = ["SP", "RJ", "MG", "RS", "PR", "SC", "BA", "DF", "ES", "GO", "PE", "CE", "PA", "MT", "MA",
+          "MS", "PB", "PI", "RN", "AL", "SE", "TO", "RO", "AM", "AC", "AP", "RR"]
+STATUSES = ["delivered", "shipped", "canceled", "unavailable", "invoiced", "processing", "created", "approved"]
+STATUS_WEIGHTS = [0.97, 0.011, 0.006, 0.006, 0.003, 0.003, 0.0005, 0.0005]
+PAYMENT_TYPES = ["credit_card", "boleto", "voucher", "debit_card", "not_defined"]
+PAYMENT_WEIGHTS = [0.74, 0.19, 0.05, 0.0199, 0.0001]
+N_CITIES = 4100
+N_SELLER_CITIES = 610
+N_CATEGORIES = 73
+N_SELLERS = 3095
+N_PRODUCTS = 32951
+FIRST_PURCHASE = pd.Timestamp("2016-09-04")
+PURCHASE_DAYS = 730
+
+# Roughly the Olist merge: 1.18 rows per order, 0.96 unique customers per order.
+ROWS_PER_ORDER = 1.18
+ORDERS_PER_CUSTOMER = 1.04
+
+
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+NIBBLE_SHIFTS = np.arange(60, -4, -4, dtype=np.uint64)
+
+
+def mix64(z):
+    # splitmix64's finalizer: a bijection on uint64 that scrambles every bit.
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hex_ids(numbers, salt):
+    # 32-character hashes, like Olist's. Each salt shifts the numbers by a
+    # different odd multiple before mixing, so no two (number, salt) pairs
+    # share an ID.
+    with np.errstate(over="ignore"):
+        high = mix64(numbers.astype(np.uint64) + np.uint64(salt) * np.uint64(0x9E3779B97F4A7C15))
+        low = mix64(high ^ np.uint64(0xD6E8FEB86659FD93))
+    words = np.stack([high, low], axis=1)
+    digits = HEX_DIGITS[(words[:, :, None] >> NIBBLE_SHIFTS) & np.uint64(15)]
+    return digits.reshape(len(numbers), 32).view("S32").ravel().astype("U32")
+
+
+def zipf_choice(rng, n_labels, size, a=1.3):
+    # A few big cities and categories, a long tail of small ones.
+    return (rng.zipf(a, size) - 1) % n_labels
+
+
+def format_times(timestamps, missing=None):
+    text = np.datetime_as_string(np.asarray(timestamps, dtype="datetime64[s]"))
+    text = np.char.replace(text, "T", " ").astype(object)
+    if missing is not None:
+        text[missing] = ""
+    return text
+
+
+def chunk_frame(rng, first_order, n_orders):
+    orders = np.arange(first_order, first_order + n_orders)
+    items = rng.geometric(1 / ROWS_PER_ORDER, n_orders)
+    order = np.repeat(orders, items)
+    n = len(order)
+    item_id = np.arange(n) - np.repeat(np.cumsum(items) - items, items) + 1
+
+    # Per-order attributes, repeated onto every item row of the order.
+    customer = (orders / ORDERS_PER_CUSTOMER).astype(np.int64)
+    # Volume grows over time, so later days are more likely.
+    days = PURCHASE_DAYS * np.sqrt(rng.random(n_orders))
+    purchased = FIRST_PURCHASE + pd.to_timedelta(days * 86400, unit="s").round("s")
+    approved = purchased + pd.to_timedelta(rng.integers(600, 86400, n_orders), unit="s")
+    carrier = approved + pd.to_timedelta(rng.integers(86400, 5 * 86400, n_orders), unit="s")
+    delivered = carrier + pd.to_timedelta(rng.gamma(2.0, 5.0, n_orders) * 86400, unit="s").round("s")
+    estimated = (purchased + pd.to_timedelta(rng.integers(10, 40, n_orders), unit="D")).normalize()
+    status = np.array(STATUSES, dtype=object)[rng.choice(len(STATUSES), n_orders, p=STATUS_WEIGHTS)]
+    undelivered = status != "delivered"
+    review = rng.choice([1, 2, 3, 4, 5], n_orders, p=[0.11, 0.03, 0.08, 0.19, 0.59]).astype(float)
+    review[rng.random(n_orders) < 0.008] = np.nan
+    city = zipf_choice(rng, N_CITIES, n_orders)
+
+    expand = np.repeat(np.arange(n_orders), items)
+    seller = rng.integers(0, N_SELLERS, n)
+    category = zipf_choice(rng, N_CATEGORIES + 1, n, a=1.1)
+    price = np.round(rng.lognormal(4.4, 0.9, n), 2)
+    delivered_days = np.where(undelivered, np.nan, np.rint((delivered - purchased).total_seconds() / 86400))
+    estimated_days = np.rint((estimated - purchased).total_seconds() / 86400)
+
+    return pd.DataFrame({
+        "order_id": hex_ids(order, 1),
+        "customer_id": hex_ids(order, 2),
+        "order_status": status[expand],
+        "order_purchase_timestamp": format_times(purchased)[expand],
+        "order_approved_at": format_times(approved)[expand],
+        "order_delivered_carrier_date": format_times(carrier, undelivered)[expand],
+        "order_delivered_customer_date": format_times(delivered, undelivered)[expand],
+        "order_estimated_delivery_date": format_times(estimated)[expand],
+        "customer_unique_id": hex_ids(customer, 3)[expand],
+        "customer_zip_code_prefix": (10000 + city * 17)[expand],
+        "customer_city": np.array([f"city_{i}" for i in range(N_CITIES)], dtype=object)[city][expand],
+        "customer_state": np.array(STATES, dtype=object)[city % len(STATES)][expand],
+        "order_item_id": item_id,
+        "product_id": hex_ids(rng.integers(0, N_PRODUCTS, n), 4),
+        "seller_id": hex_ids(seller, 5),
+        "shipping_limit_date": format_times(carrier)[expand],
+        "price": price,
+        "freight_value": np.round(rng.lognormal(2.8, 0.5, n), 2),
+        "payment_sequential": np.where(rng.random(n) < 0.04, rng.integers(2, 6, n), 1).astype(float),
+        "payment_type": np.array(PAYMENT_TYPES, dtype=object)[rng.choice(len(PAYMENT_TYPES), n, p=PAYMENT_WEIGHTS)],
+        "payment_installments": rng.integers(1, 11, n).astype(float),
+        "payment_value": np.round(price * items[expand], 2),
+        "review_id": hex_ids(order, 6),
+        "review_score": review[expand],
+        "product_category_name": np.array([f"category_{i}" for i in range(N_CATEGORIES)] + [None],
+                                          dtype=object)[category],
+        "seller_zip_code_prefix": 1000 + seller % N_SELLER_CITIES * 13,
+        "seller_city": np.array([f"city_{i}" for i in range(N_SELLER_CITIES)], dtype=object)[seller % N_SELLER_CITIES],
+        "seller_state": np.array(STATES[:22], dtype=object)[seller % 22],
+        "delivery_time": delivered_days[expand],
+        "estimated_delivery_time": estimated_days[expand]
+    }, columns=COLUMNS)
+
+
+def generate(path, rows, seed=0, chunk_rows=500000):
+    # Writes at least rows rows (whole orders only) and returns the count.
+    rng = np.random.default_rng(seed)
+    orders_per_chunk = max(int(chunk_rows / ROWS_PER_ORDER), 1)
+    written, first_order = 0, 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n_orders = max(min(orders_per_chunk, int((rows - written) / ROWS_PER_ORDER)), 1)
+            chunk = chunk_frame(rng, first_order, n_orders)
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += len(chunk)
+            first_order += n_orders
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = generate(args.path, args.rows, args.seed, args.chunk_rows)
+    print(f"{rows} rows in {time.perf_counter() - start:.1f} s -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
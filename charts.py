@@ -0,0 +1,280 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import config
+import telemetry
+import warmup
+
+colors_1 = ["#72BCD4", "#D3D3D3", "#D3D3D3", "#D3D3D3", "#D3D3D3"]
+colors_2 = ["#72BCD4"] + ["#D3D3D3"] * 28
+colors_3 = ["#72BCD4"] + ["#D3D3D3"] * 22
+colors_4 = ["#D3D3D3", "#D3D3D3", "#D3D3D3", "#D3D3D3", "#72BCD4"]
+colors_5 = ["#72BCD4"] + ["#D3D3D3"] * 7
+colors_6 = ["#72BCD4"] * 10
+
+_plotting = None
+_plotting_lock = threading.Lock()
+
+
+def plotting():
+    # seaborn and matplotlib take most of a second to import, so they are
+    # only loaded, and seaborn's style applied, once a chart is drawn.
+    global _plotting
+    with _plotting_lock:
+        if _plotting is None:
+            import seaborn as sns
+            from matplotlib.figure import Figure
+            sns.set(style='dark')
+            _plotting = sns, Figure
+    return _plotting
+
+
+# Figures are built on matplotlib.figure.Figure rather than pyplot, so they
+# never enter pyplot's global registry and are freed once rendered.
+
+
+def line_chart(data, column, x='Months'):
+    _, Figure = plotting()
+    from matplotlib.ticker import MaxNLocator
+    fig = Figure(figsize=(24,12))
+    ax = fig.subplots()
+    ax.plot(
+        data[x],
+        data[column],
+        marker='o',
+        linewidth=3,
+        color="#72BCD4"
+    )
+    # Daily and weekly series have too many periods to label every one.
+    if len(data) > 36:
+        ax.xaxis.set_major_locator(MaxNLocator(24, integer=True))
+    ax.tick_params(axis='x', labelsize=14)
+    ax.tick_params(axis='y', labelsize=16)
+    return fig
+
+
+def top_bottom_chart(top, bottom, x, y, xlabel, top_title, bottom_title, figsize, title_size):
+    sns, Figure = plotting()
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots(nrows=1, ncols=2)
+
+    sns.barplot(x=x, y=y, data=top, palette=colors_1, ax=ax[0], legend=False)
+    ax[0].set_ylabel(None)
+    ax[0].set_xlabel(xlabel, fontsize=15)
+    ax[0].set_title(top_title, loc="center", fontsize=title_size)
+    ax[0].tick_params(axis ='y', labelsize=12)
+
+    sns.barplot(x=x, y=y, data=bottom, palette=colors_1, ax=ax[1], legend=False)
+    ax[1].set_ylabel(None)
+    ax[1].set_xlabel(xlabel, fontsize=15)
+    ax[1].invert_xaxis()
+    ax[1].yaxis.set_label_position("right")
+    ax[1].yaxis.tick_right()
+    ax[1].set_title(bottom_title, loc="center", fontsize=title_size)
+    ax[1].tick_params(axis='y', labelsize=12)
+
+    for i, bar in enumerate(ax[0].patches):
+        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
+                    va='center', ha='right', color='black', fontsize=12)
+
+    for i, bar in enumerate(ax[1].patches):
+        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
+                    va='center', ha='left', color='black', fontsize=12)
+    return fig
+
+
+def order_status_chart(by_order_status):
+    sns, Figure = plotting()
+    fig = Figure(figsize=(16, 8))
+    ax = fig.subplots()
+
+    sns.barplot(
+        x="order_id",
+        y="order_status",
+        data=by_order_status.sort_values(by="order_id", ascending=False),
+        palette=colors_5,
+        legend=False,
+        ax=ax
+    )
+    ax.set_ylabel(None)
+    ax.set_xlabel("Total Orders", fontsize=15)
+    ax.tick_params(axis='y', labelsize=12)
+
+    for i, value in enumerate(by_order_status["order_id"]):
+        ax.text(value, i, f' {value}', va='center', color='black')
+    return fig
+
+
+def review_chart(by_review):
+    sns, Figure = plotting()
+    fig = Figure()
+    ax = fig.subplots()
+
+    sns.barplot(x="review_score", y="order_id", data=by_review, palette=colors_4, legend=False, ax=ax)
+    ax.set_ylabel("Total Orders", fontsize=15)
+    ax.set_xlabel(None)
+    ax.tick_params(axis='x', labelsize=12)
+
+    for i, value in enumerate(by_review["order_id"]):
+        ax.text(i, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
+    return fig
+
+
+def recency_chart(top_recency):
+    sns, Figure = plotting()
+    fig = Figure(figsize= (15,5))
+    ax = fig.subplots()
+
+    sns.barplot(y="recency", x="customer_unique_id", data=top_recency, palette=colors_6, legend=False, ax=ax)
+    ax.set_title("Customer by Recency (days)", fontsize=25)
+    ax.set_ylabel(None)
+    ax.set_xlabel("Customer Unique ID", fontsize=15)
+    ax.set_ylim(0)
+    ax.tick_params(axis='x', labelsize=12)
+    return fig
+
+
+def frequency_chart(top_frequency):
+    sns, Figure = plotting()
+    fig = Figure(figsize= (15,5))
+    ax = fig.subplots()
+
+    sns.barplot(y="frequency", x="customer_unique_id", data=top_frequency, palette=colors_6, legend=False, ax=ax)
+    ax.set_title("Customer by Frequency", fontsize=25)
+    ax.set_ylabel(None)
+    ax.set_xlabel("Customer Unique ID", fontsize=15)
+    ax.set_ylim(0)
+    ax.tick_params(axis='x', labelsize=12)
+
+    for i, p in enumerate(ax.patches):
+        ax.annotate(f'{p.get_height():.0f}', (p.get_x() + p.get_width() / 2., p.get_height()), ha='center', va='bottom', fontsize=10, color='black')
+    return fig
+
+
+def monetary_chart(top_monetary):
+    sns, Figure = plotting()
+    fig = Figure(figsize= (16,8))
+    ax = fig.subplots()
+
+    sns.barplot(y="monetary", x="customer_unique_id", data=top_monetary, palette=colors_6, legend=False, ax=ax)
+    ax.set_title("Customer by Monetary", fontsize=25)
+    ax.set_ylabel(None)
+    ax.set_xlabel("Customer Unique ID", fontsize=15)
+    ax.set_ylim(0)
+    ax.tick_params(axis='x', labelsize=12)
+
+    for i, v in enumerate(top_monetary['monetary']):
+        ax.text(i, v + 10, str(v), color='#333333', ha='center', va='bottom', fontsize=10)
+    return fig
+
+
+def payment_sequential_chart(by_payment_sequential):
+    sns, Figure = plotting()
+    fig = Figure(figsize=(18,9))
+    ax = fig.subplots()
+
+    sns.barplot(x="payment_sequential", y="order_id", data=by_payment_sequential, palette=colors_2, legend=False, ax=ax)
+    ax.set_ylabel("Total Orders", fontsize=15)
+    ax.set_xlabel(None)
+    ax.tick_params(axis='x', labelsize=12)
+
+    for i, value in enumerate(by_payment_sequential["order_id"]):
+        ax.text(i, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
+    return fig
+
+
+def payment_type_chart(by_payment_type):
+    _, Figure = plotting()
+    fig = Figure(figsize=(9,9))
+    ax = fig.subplots()
+
+    ax.pie(
+    x=by_payment_type["order_id"],
+    labels=by_payment_type["payment_type"],
+    autopct='%1.1f%%')
+    return fig
+
+
+def payment_installment_chart(by_payment_installment):
+    sns, Figure = plotting()
+    sort_payment_installment = by_payment_installment['payment_installments'].tolist()
+
+    fig = Figure(figsize=(16,8))
+    ax = fig.subplots()
+
+    sns.barplot(x="payment_installments", y="order_id", data=by_payment_installment, palette=colors_3, order=sort_payment_installment, legend=False, ax=ax)
+    ax.set_ylabel("Total Orders", fontsize=15)
+    ax.set_xlabel(None)
+    ax.tick_params(axis='x', labelsize=12)
+
+    for i, value in enumerate(by_payment_installment["order_id"], start=1):
+        ax.text(i - 1, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
+    return fig
+
+
+class ChartCache:
+    # LRU of rendered image bytes, bounded by their total size. Images drawn
+    # by the boot warm-up are pinned and never evicted.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            if key in self._entries or len(image) > self.max_bytes:
+                return
+            self._entries[key] = image
+            self.size += len(image)
+            if warmup.active.get():
+                self._pinned.add(key)
+            while self.size > self.max_bytes:
+                victim = next((old for old in self._entries if old not in self._pinned), None)
+                if victim is None:
+                    break
+                self.size -= len(self._entries.pop(victim))
+
+
+chart_cache = ChartCache(config.CHART_CACHE_MB * 2**20)
+# Seaborn and matplotlib's text layout are not safe to drive from several
+# Streamlit session threads at once.
+_render_lock = threading.Lock()
+
+
+def chart_key(draw, frames, params, image_format):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((draw.__name__, sorted(params.items()), image_format)).encode())
+    for frame in frames:
+        digest.update(repr((list(frame.columns), [str(dtype) for dtype in frame.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render(draw, *frames, image_format="png", **params):
+    # Draws only when this exact data and these parameters have not been
+    # rendered before; otherwise the cached bytes are served.
+    key = chart_key(draw, frames, params, image_format)
+    image = chart_cache.get(key)
+    if image is None:
+        with telemetry.measure("chart:" + draw.__name__, "chart"), _render_lock:
+            fig = draw(*frames, **params)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=image_format, bbox_inches="tight", dpi=config.CHART_DPI)
+            fig.clear()
+        image = buffer.getvalue()
+        chart_cache.put(key, image)
+    return image
@@ -0,0 +1,50 @@
+import os
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# Worker count for the metric executor; 1 keeps everything on the script thread.
+WORKERS = env_int("DASHBOARD_WORKERS", min(os.cpu_count() or 1, 8))
+# "thread" shares the frame directly; "process" has each worker memory-map
+# the Feather cache instead, so nothing is pickled.
+EXECUTOR = os.environ.get("DASHBOARD_EXECUTOR", "thread")
+# Below this many rows the pool overhead outweighs the work.
+PARALLEL_MIN_ROWS = env_int("DASHBOARD_PARALLEL_MIN_ROWS", 250000)
+# Byte budget for rendered chart images kept in memory.
+CHART_CACHE_MB = env_int("DASHBOARD_CHART_CACHE_MB", 64)
+# Same resolution st.pyplot renders at.
+CHART_DPI = env_int("DASHBOARD_CHART_DPI", 200)
+# "cache" loads the whole Feather copy of the CSV; "store" reads the
+# month-partitioned store from ingest.py, opening only the months and
+# columns each tab needs; "sql" runs every metric as a DuckDB query over a
+# Parquet mirror of that store (see sql_backend.py).
+DATA_SOURCE = os.environ.get("DASHBOARD_SOURCE", "cache")
+# DuckDB worker threads for the "sql" source; 0 leaves DuckDB's default of
+# one per core.
+SQL_THREADS = env_int("DASHBOARD_SQL_THREADS", 0)
+# When set, every open session checks main_data.csv this often and reruns
+# as soon as rows were appended, picking up the incrementally merged data.
+REFRESH_SECONDS = env_int("DASHBOARD_REFRESH_SECONDS", 0)
+# Per-stage timings: 1 logs each one as a JSON line and keeps rolling
+# percentiles; a file path additionally gets Prometheus text after each rerun.
+TELEMETRY = env_int("DASHBOARD_TELEMETRY", 0)
+TELEMETRY_WINDOW = env_int("DASHBOARD_TELEMETRY_WINDOW", 1000)
+PROMETHEUS_FILE = os.environ.get("DASHBOARD_PROMETHEUS_FILE", "")
+# Sidebar panel with this rerun's stages and the percentiles across sessions.
+PROFILE_PANEL = env_int("DASHBOARD_PROFILE_PANEL", 0)
+# "matplotlib" renders PNGs on the server; "vega" sends the aggregated rows
+# and a Vega-Lite spec for the browser to draw.
+CHART_BACKEND = os.environ.get("DASHBOARD_CHART_BACKEND", "matplotlib")
+# Metric results shared by every session of the process; with a directory
+# they are also written to disk and reused after a restart.
+RESULT_CACHE_MB = env_int("DASHBOARD_RESULT_CACHE_MB", 256)
+RESULT_CACHE_DIR = os.environ.get("DASHBOARD_RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MB = env_int("DASHBOARD_RESULT_CACHE_DISK_MB", 1024)
+# While a session is idle, results for its likely next date ranges are
+# computed in the background, using at most this much CPU time per idle
+# spell (0 turns speculation off), and kept for this many ranges.
+PREFETCH_CPU_MS = env_int("DASHBOARD_PREFETCH_CPU_MS", 2000)
+PREFETCH_RANGES = env_int("DASHBOARD_PREFETCH_RANGES", 8)
@@ -0,0 +1,304 @@
+import numpy as np
+import pandas as pd
+
+from distinct import column_codes, count_distinct
+
+# Every dimension the dashboard breaks orders down by, and the ID it counts.
+DIMENSIONS = {
+    "customer_city": "customer_id",
+    "customer_state": "customer_id",
+    "seller_city": "seller_id",
+    "seller_state": "seller_id",
+    "payment_type": "order_id",
+    "payment_sequential": "order_id",
+    "payment_installments": "order_id",
+    "review_score": "order_id",
+    "order_status": "order_id",
+    "product_category_name": "order_id"
+}
+
+# IDs that belong to a single order. All rows of an order share one purchase
+# timestamp and Olist gives every order its own customer_id, so each of these
+# IDs should fall on one day, and then its per-day distinct counts add up
+# over any range. build_daily_cube checks this, and an ID that does recur
+# across days keeps (day, key, id) pairs like sellers do.
+ORDER_IDS = {"order_id", "customer_id"}
+
+# Dashboard result -> (dimension, whether it is sorted by count, descending).
+CUBE_METRICS = {
+    "by_customer_city": ("customer_city", True),
+    "by_customer_state": ("customer_state", True),
+    "by_payment_sequential": ("payment_sequential", True),
+    "by_payment_type": ("payment_type", True),
+    "by_payment_installment": ("payment_installments", True),
+    "by_review": ("review_score", False),
+    "by_order_status": ("order_status", True),
+    "by_product_category": ("product_category_name", False),
+    "by_seller_city": ("seller_city", True),
+    "by_seller_state": ("seller_state", True)
+}
+
+
+def reduce_cells(day, key_codes, n_keys, id_codes, n_ids, price, rows=None):
+    # rows weights each input by the rows it already stands for, so cells
+    # built from separate chunks can be merged by passing them back through.
+    keep = key_codes >= 0
+    day, key_codes, id_codes, price = day[keep], key_codes[keep], id_codes[keep], price[keep]
+
+    # One cell per (day, key, id); the id slot is shifted by one so missing
+    # IDs (-1) still get a cell and keep their key observed for that day.
+    cell = (day * n_keys + key_codes) * (n_ids + 1) + (id_codes + 1)
+    if rows is None:
+        cell, inverse, rows = np.unique(cell, return_inverse=True, return_counts=True)
+    else:
+        cell, inverse = np.unique(cell, return_inverse=True)
+        rows = np.bincount(inverse, weights=rows[keep], minlength=len(cell)).astype(np.int64)
+    price = np.bincount(inverse, weights=np.nan_to_num(price), minlength=len(cell))
+
+    day_key, id_slot = np.divmod(cell, n_ids + 1)
+    cell_day, cell_key = np.divmod(day_key, n_keys)
+    return {
+        "day": cell_day.astype(np.int32),
+        "key": cell_key.astype(np.int32),
+        "id": (id_slot - 1).astype(np.int32),
+        "rows": rows,
+        "price": price
+    }
+
+
+def group_sums(values, starts):
+    return np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+
+def bucket_cells(cells, per_order):
+    # Collapses (day, key, id) cells, sorted in that order, into one bucket
+    # per (day, key) with its rows, price and, when the ID belongs to one
+    # order, its distinct IDs. IDs that recur across days (sellers) cannot be
+    # summed over days, so their (day, key, id) pairs are kept instead; those
+    # grow with days times active sellers, not with orders.
+    day, key = cells["day"], cells["key"]
+    starts = np.flatnonzero(np.concatenate([[True], (day[1:] != day[:-1]) | (key[1:] != key[:-1])]))
+    starts = starts if len(day) else starts[:0]
+    buckets = {
+        "day": day[starts],
+        "key": key[starts],
+        "rows": group_sums(cells["rows"], starts),
+        "price": group_sums(cells["price"], starts)
+    }
+    known = cells["id"] >= 0
+    if per_order:
+        buckets["ids"] = group_sums(known.astype(np.int64), starts)
+        return buckets, None
+    return buckets, {field: cells[field][known] for field in ["day", "key", "id"]}
+
+
+def build_dimension(day, key_codes, labels, id_codes, id_labels, price, per_order):
+    cells = reduce_cells(day, key_codes, len(labels), id_codes, len(id_labels), price)
+    buckets, pairs = bucket_cells(cells, per_order)
+    return {
+        "labels": labels,
+        "buckets": buckets,
+        "pairs": pairs,
+        # Only pairs refer to IDs, so only they need the labels behind the codes.
+        "id_labels": None if per_order else id_labels
+    }
+
+
+def spread_ids(day, ids):
+    # The ORDER_IDS with an ID on more than one day of these rows.
+    spread = set()
+    for id_column in ORDER_IDS:
+        codes, labels = ids[id_column]
+        known = codes >= 0
+        first = np.full(len(labels), np.iinfo(np.int64).max)
+        np.minimum.at(first, codes[known], day[known])
+        if (first[codes[known]] != day[known]).any():
+            spread.add(id_column)
+    return spread
+
+
+def crossing_ids(df, start):
+    # The ORDER_IDS with an ID both in the rows before start and in the
+    # dated rows from start on.
+    timestamps = df['order_purchase_timestamp'].to_numpy("datetime64[ns]")
+    dated = ~np.isnat(timestamps[start:])
+    crossing = set()
+    for id_column in ORDER_IDS:
+        codes, labels = column_codes(df[id_column])
+        # Missing IDs (-1) land in the extra last slot, which stays unset.
+        seen = np.zeros(len(labels) + 1, dtype=bool)
+        seen[codes[:start]] = True
+        seen[-1] = False
+        if seen[codes[start:][dated]].any():
+            crossing.add(id_column)
+    return crossing
+
+
+def id_hashes(df):
+    # Per ORDER_IDS column, hashes of the distinct IDs on df's dated rows, so
+    # cubes built apart can tell whether an ID recurs across them without
+    # keeping the IDs. A collision only costs the slower, exact pair path.
+    dated = df['order_purchase_timestamp'].notna().to_numpy()
+    hashes = {}
+    for id_column in ORDER_IDS:
+        codes, labels = column_codes(df[id_column])
+        used = np.unique(codes[dated & (codes >= 0)])
+        hashes[id_column] = pd.util.hash_array(np.asarray(labels.take(used), dtype=object), categorize=False)
+    return hashes
+
+
+def cube_pair_ids(cube):
+    # The ORDER_IDS that cube keeps pairs for.
+    return {spec["id_column"] for spec in cube["dimensions"].values() if spec["pairs"] is not None} & ORDER_IDS
+
+
+def build_daily_cube(df, pair_ids=()):
+    # Rows without a purchase time fall in no date range, so they are left
+    # out, as in timeseries.daily_totals. IDs in pair_ids keep pairs even if
+    # they fall on one day in df, so the cube merges with one where they do.
+    timestamps = df['order_purchase_timestamp'].to_numpy("datetime64[ns]")
+    dated = ~np.isnat(timestamps)
+    days = timestamps[dated].astype('datetime64[D]')
+    first_day = days.min() if len(days) else np.datetime64("1970-01-01", "D")
+    day = (days - first_day).astype(np.int64)
+    price = df['price'].to_numpy(np.float64)[dated]
+
+    ids = {}
+    for id_column in set(DIMENSIONS.values()):
+        codes, labels = column_codes(df[id_column])
+        ids[id_column] = codes[dated], labels
+    pair_ids = set(pair_ids) | spread_ids(day, ids)
+
+    dimensions = {}
+    for dimension, id_column in DIMENSIONS.items():
+        key_codes, labels = column_codes(df[dimension])
+        key_codes = key_codes[dated]
+        id_codes, id_labels = ids[id_column]
+        dimensions[dimension] = dict(
+            build_dimension(day, key_codes, labels, id_codes, id_labels, price,
+                            id_column in ORDER_IDS and id_column not in pair_ids),
+            id_column=id_column
+        )
+
+    return {
+        "first_day": first_day,
+        "dimensions": dimensions
+    }
+
+
+def merge_cubes(cubes):
+    # Cubes over disjoint sets of days, such as one per month of the store,
+    # as one cube. They must keep pairs for the same IDs. Keys and the IDs
+    # of pairs are recoded against the sorted union of every cube's labels.
+    first_day = min(cube["first_day"] for cube in cubes)
+    dimensions = {}
+    for dimension, id_column in DIMENSIONS.items():
+        specs = [cube["dimensions"][dimension] for cube in cubes]
+        labels = union_labels(spec["labels"] for spec in specs)
+        per_order = specs[0]["pairs"] is None
+        id_labels = None if per_order else union_labels(spec["id_labels"] for spec in specs)
+        buckets, pairs = [], []
+        for cube, spec in zip(cubes, specs):
+            shift = (cube["first_day"] - first_day).astype(np.int64)
+            key_map = labels.get_indexer(spec["labels"]).astype(np.int32)
+            buckets.append(dict(spec["buckets"], day=spec["buckets"]["day"] + shift,
+                                key=key_map[spec["buckets"]["key"]]))
+            if not per_order:
+                id_map = id_labels.get_indexer(spec["id_labels"]).astype(np.int32)
+                pairs.append(dict(spec["pairs"], day=spec["pairs"]["day"] + shift,
+                                  key=key_map[spec["pairs"]["key"]], id=id_map[spec["pairs"]["id"]]))
+        dimensions[dimension] = {
+            "labels": labels,
+            "buckets": sort_by_day(buckets),
+            "pairs": None if per_order else sort_by_day(pairs),
+            "id_labels": id_labels,
+            "id_column": id_column
+        }
+    return {
+        "first_day": first_day,
+        "dimensions": dimensions
+    }
+
+
+def extend_cube(cube, tail):
+    # cube with every day from tail's first day on replaced by tail, the cube
+    # of the rows from that day, e.g. after rows were appended to the file.
+    # Earlier days keep their buckets, so only the tail's rows are reduced.
+    stop = (tail["first_day"] - cube["first_day"]).astype(np.int64)
+    dimensions = {}
+    for dimension, spec in cube["dimensions"].items():
+        head = {"buckets": spec["buckets"], "pairs": spec["pairs"]}
+        for name, cells in head.items():
+            if cells is not None:
+                keep = slice(0, np.searchsorted(cells["day"], stop))
+                head[name] = {field: values[keep] for field, values in cells.items()}
+        dimensions[dimension] = dict(spec, **head)
+    return merge_cubes([{"first_day": cube["first_day"], "dimensions": dimensions}, tail])
+
+
+def union_labels(indexes):
+    indexes = list(indexes)
+    return indexes[0].append(indexes[1:]).unique().sort_values() if len(indexes) > 1 else indexes[0]
+
+
+def sort_by_day(parts):
+    merged = {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+    order = np.lexsort((merged["key"], merged["day"]))
+    return {field: values[order].astype(np.int32) if field in ("day", "key", "id") else values[order]
+            for field, values in merged.items()}
+
+
+def day_slice(cube, days, start_date, end_date):
+    # start_date and end_date are both included as whole days.
+    first_day = cube["first_day"]
+    start = (np.datetime64(start_date, 'D') - first_day).astype(np.int64)
+    end = (np.datetime64(end_date, 'D') - first_day).astype(np.int64)
+    return slice(*np.searchsorted(days, [start, end + 1]))
+
+
+def query_dimension(cube, dimension, start_date, end_date):
+    # Touches one bucket per (day, key) in range, plus the (day, key, id)
+    # pairs of IDs that recur across days.
+    spec = cube["dimensions"][dimension]
+    buckets = spec["buckets"]
+    window = day_slice(cube, buckets["day"], start_date, end_date)
+    key = buckets["key"][window].astype(np.int64)
+    n_keys = len(spec["labels"])
+
+    rows = np.bincount(key, weights=buckets["rows"][window], minlength=n_keys).astype(np.int64)
+    price = np.bincount(key, weights=buckets["price"][window], minlength=n_keys)
+    observed = np.flatnonzero(rows)
+    if spec["pairs"] is None:
+        distinct = np.bincount(key, weights=buckets["ids"][window], minlength=n_keys).astype(np.int64)
+    else:
+        pairs = spec["pairs"]
+        pair_window = day_slice(cube, pairs["day"], start_date, end_date)
+        distinct, _ = count_distinct(pairs["key"][pair_window].astype(np.int64), n_keys,
+                                     pairs["id"][pair_window].astype(np.int64), len(spec["id_labels"]))
+
+    index = pd.Index(spec["labels"].take(observed), name=dimension)
+    return pd.DataFrame({
+        spec["id_column"]: distinct[observed],
+        "rows": rows[observed],
+        "price": price[observed]
+    }, index=index)
+
+
+def query_cube(cube, start_date, end_date, metrics=None):
+    results = {}
+    for name in CUBE_METRICS if metrics is None else metrics:
+        dimension, descending = CUBE_METRICS[name]
+        result = query_dimension(cube, dimension, start_date, end_date)
+        if name == "by_product_category":
+            result = result[["order_id", "price"]].reset_index()
+            result.rename(columns={
+            "order_id" : "Total Orders",
+            "price" : "Total Revenue"
+            }, inplace=True)
+        else:
+            result = result[cube["dimensions"][dimension]["id_column"]]
+            if descending:
+                result = result.sort_values(ascending=False)
+            result = result.reset_index()
+        results[name] = result
+    return results
@@ -1,120 +1,102 @@
+import time
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-sns.set(style='dark')
-
-def create_by_customer_city(df):
-    by_customer_city = df.groupby(by="customer_city").customer_id.nunique().sort_values(ascending=False).reset_index()
-    return by_customer_city
-
-def create_by_customer_state(df):
-    by_customer_state = df.groupby(by="customer_state").customer_id.nunique().sort_values(ascending=False).reset_index()
-    return by_customer_state
-
-def create_by_payment_sequential(df):
-    by_payment_sequential = df.groupby(by="payment_sequential").order_id.nunique().sort_values(ascending=False).reset_index()
-    return by_payment_sequential
-
-def create_by_payment_type(df):
-    by_payment_type = df.groupby(by="payment_type").order_id.nunique().sort_values(ascending=False).reset_index()
-    return by_payment_type
-
-def create_by_payment_installment(df):
-    by_payment_installment = df.groupby(by="payment_installments").order_id.nunique().sort_values(ascending=False).reset_index()
-    return by_payment_installment
-
-def create_by_review(df):
-    by_review = df.groupby(by="review_score").order_id.nunique().reset_index()
-    return by_review
-
-def create_by_order_status(df):
-    by_order_status = df.groupby(by="order_status").order_id.nunique().sort_values(ascending=False).reset_index()
-    return by_order_status
-
-def create_estimated_delivery_time(df):
-    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
-    df = df.assign(order_estimated_delivery_date=pd.to_datetime(df['order_estimated_delivery_date'])).reset_index(drop=True)
-    estimated_delivery_time = df['order_estimated_delivery_date'] - df['order_purchase_timestamp']
-    estimated_delivery_time = estimated_delivery_time.dt.total_seconds() / 86400
-    df = df.assign(estimated_delivery_time=round(estimated_delivery_time)).reset_index(drop=True)
-    mean_estimated_delivery_time = df['estimated_delivery_time'].mean()
-    return mean_estimated_delivery_time
-
-def create_delivery_time(df):
-    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
-    df = df.assign(order_delivered_customer_date=pd.to_datetime(df['order_delivered_customer_date'])).reset_index(drop=True)
-    delivery_time = df['order_delivered_customer_date'] - df['order_purchase_timestamp']
-    delivery_time = delivery_time.dt.total_seconds() / 86400
-    df = df.assign(delivery_time=round(delivery_time)).reset_index(drop=True)
-    mean_delivery_time = df['delivery_time'].mean()
-    return mean_delivery_time
-
-def create_late_delivery_time(df):
-    late_delivery = (df['delivery_time'] > df['estimated_delivery_time']).sum()
-    return late_delivery
-
-def create_monthly_order(df):
-    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
-    monthly_order = df.resample(rule='M', on='order_purchase_timestamp').agg({
-    "order_id" : "nunique",
-    "price" : "sum",
-    "freight_value" : "mean"
-    })
-    monthly_order.index = monthly_order.index.strftime('%Y-%m')
-    monthly_order = monthly_order.reset_index()
-    monthly_order.rename(columns={
-    "order_purchase_timestamp" : "Months",
-    "order_id" : "Total Orders",
-    "price" : "Total Revenue",
-    "freight_value" : "Average Shipping Cost per Order"
-    }, inplace=True)
-    monthly_order['average_order_value'] = monthly_order['Total Revenue'] / monthly_order['Total Orders']
-    monthly_order.rename(columns={"average_order_value" : "Average Order Value"}, inplace=True)
-    return monthly_order
-
-def create_rfm(df):
-    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
-    rfm = df.groupby(by="customer_unique_id", as_index=False).agg({
-    "order_purchase_timestamp": "max",
-    "order_id": "nunique",
-    "price": "sum"
-    })
-    rfm.columns = ["customer_unique_id", "max_order_timestamp", "frequency", "monetary"]
-    recent_date = df['order_purchase_timestamp'].max()
-    rfm['recency'] = (recent_date - rfm['max_order_timestamp']).dt.days
-    rfm.drop("max_order_timestamp", axis=1, inplace=True)
-    return rfm
-
-def create_by_product_category(df):
-    by_product_category = df.groupby(by="product_category_name").agg({
-    "order_id" : "nunique",
-    "price" : "sum"
-    })
-    by_product_category = by_product_category.reset_index()
-    by_product_category.rename(columns={
-    "order_id" : "Total Orders",
-    "price" : "Total Revenue"
-    }, inplace=True)
-    return by_product_category
-
-def create_by_seller_city(df):
-    by_seller_city = df.groupby(by="seller_city").seller_id.nunique().sort_values(ascending=False).reset_index()
-    return by_seller_city
-
-def create_by_seller_state(df):
-    by_seller_state = df.groupby(by="seller_state").seller_id.nunique().sort_values(ascending=False).reset_index()
-    return by_seller_state
-
-all_df = pd.read_csv("main_data.csv")
-
-datetime_columns = ['order_purchase_timestamp', 'order_delivered_customer_date', 'order_estimated_delivery_date']
-all_df.sort_values(by="order_purchase_timestamp", inplace=True)
-all_df.reset_index(inplace=True)
-for column in datetime_columns:
-    all_df[column] = pd.to_datetime(all_df[column])
-min_date = all_df['order_purchase_timestamp'].min()
-max_date = all_df['order_purchase_timestamp'].max()
+from charts import render
+import config
+import result_cache
+import telemetry
+import vega_charts
+import warmup
+from cube import CUBE_METRICS
+from data_loader import cache_paths, slice_dates, source_fingerprint
+from dataset import load_dataset, load_store_rfm_index
+from executor import compute_metrics, iter_metrics
+from ingest import load_store, read_range, read_store_series, store_dir
+from lazy import TAB_METRICS, LazyMetrics
+from planner import metric_columns
+from prefetch import Prefetcher, adjacent_ranges
+from report import section_charts, section_metrics
+from rfm_engine import RFMWindow
+from timeseries import GRANULARITIES, SERIES_METRICS, TimeSeries
+
+if config.DATA_SOURCE == "sql":
+    # Only sql mode needs DuckDB and pyarrow's Parquet writer; the other
+    # modes keep pyarrow optional.
+    import sql_backend
+
+@st.cache_resource
+def latest_versions():
+    # The newest state each loader built, kept past its cache entry so the
+    # next version of the CSV is extended from it instead of rebuilt.
+    return {}
+
+@st.cache_resource(max_entries=1)
+def get_dataset(path, fingerprint):
+    # fingerprint (mtime, size) is only part of the cache key, so a changed
+    # CSV reloads while every session of this process shares one frame and
+    # the cube, RFM index and time series built from it.
+    latest = latest_versions()
+    dataset = latest[("dataset", path)] = load_dataset(path, latest.get(("dataset", path)))
+    return dataset
+
+@st.cache_resource(max_entries=1)
+def get_store(path, fingerprint):
+    return load_store(path)
+
+@st.cache_resource(max_entries=1)
+def get_parquet(path, fingerprint):
+    return sql_backend.sync_parquet(path)
+
+@st.cache_resource(max_entries=1)
+def get_store_rfm_index(path, fingerprint):
+    # The RFM window walks every row, but only needs these four columns,
+    # read one month at a time, and after an append only the changed months.
+    latest = latest_versions()
+    state = latest[("store_rfm", path)] = load_store_rfm_index(path, latest.get(("store_rfm", path)))
+    return state["index"]
+
+@st.cache_resource(max_entries=1)
+def get_store_timeseries(path, fingerprint):
+    # Merged from the store's monthly summaries; no row is read.
+    return TimeSeries(*read_store_series(store_dir(path)))
+
+rerun_start = time.perf_counter()
+profile = telemetry.start_profile() if config.PROFILE_PANEL else None
+
+with telemetry.measure("load"):
+    fingerprint = source_fingerprint("main_data.csv")
+    if config.DATA_SOURCE == "store":
+        store_meta, daily_cube = get_store("main_data.csv", fingerprint)
+        rfm_index = get_store_rfm_index("main_data.csv", fingerprint)
+        timeseries = get_store_timeseries("main_data.csv", fingerprint)
+        min_date = pd.Timestamp(store_meta['min_timestamp'])
+        max_date = pd.Timestamp(store_meta['max_timestamp'])
+    elif config.DATA_SOURCE == "sql":
+        # Syncing the Parquet mirror refreshes the store it is built from.
+        store_meta, parquet_dir = get_parquet("main_data.csv", fingerprint)
+        rfm_index = get_store_rfm_index("main_data.csv", fingerprint)
+        timeseries = get_store_timeseries("main_data.csv", fingerprint)
+        min_date = pd.Timestamp(store_meta['min_timestamp'])
+        max_date = pd.Timestamp(store_meta['max_timestamp'])
+    else:
+        dataset = get_dataset("main_data.csv", fingerprint)
+        all_df = dataset["df"]
+        daily_cube = dataset["cube"]
+        rfm_index = dataset["rfm_index"]
+        timeseries = dataset["timeseries"]
+        min_date = all_df['order_purchase_timestamp'].min()
+        max_date = all_df['order_purchase_timestamp'].max()
+
+if config.REFRESH_SECONDS:
+    @st.fragment(run_every=config.REFRESH_SECONDS)
+    def watch_source():
+        # Only this fragment reruns on the timer; the whole script reruns
+        # once the CSV has changed, and the loaders merge just the new rows.
+        if source_fingerprint("main_data.csv") != fingerprint:
+            st.rerun()
+
+    watch_source()
 
 with st.sidebar:
     start_date, end_date = st.date_input(
@@ -123,464 +105,266 @@ with st.sidebar:
         max_value=max_date,
         value=[min_date, max_date]
     )
-
-filtered_data = all_df[(all_df['order_purchase_timestamp'] >= str(start_date)) &
-                 (all_df['order_purchase_timestamp'] <= str(end_date))]
-
-by_customer_city = create_by_customer_city(filtered_data)
-by_customer_state = create_by_customer_state(filtered_data)
-by_payment_sequential = create_by_payment_sequential(filtered_data)
-by_payment_type = create_by_payment_type(filtered_data)
-by_payment_installment = create_by_payment_installment(filtered_data)
-by_review = create_by_review(filtered_data)
-by_order_status = create_by_order_status(filtered_data)
-mean_estimated_delivery_time = create_estimated_delivery_time(filtered_data)
-mean_delivery_time = create_delivery_time(filtered_data)
-late_delivery = create_late_delivery_time(filtered_data)
-monthly_order = create_monthly_order(filtered_data)
-rfm = create_rfm(filtered_data)
-by_product_category = create_by_product_category(filtered_data)
-by_seller_city = create_by_seller_city(filtered_data)
-by_seller_state = create_by_seller_state(filtered_data)
+    granularity = st.selectbox("Granularity", list(GRANULARITIES), index=list(GRANULARITIES).index("Monthly"))
+
+if "prefetcher" not in st.session_state:
+    st.session_state["prefetcher"] = Prefetcher(config.PREFETCH_RANGES, config.PREFETCH_CPU_MS / 1000)
+prefetcher = st.session_state["prefetcher"]
+# Any input reruns the script; speculation for the old range stops here.
+prefetcher.cancel()
+
+def filter_rows(names, start_date, end_date):
+    if config.DATA_SOURCE == "store":
+        # Only the months in range and the columns of the metrics that the
+        # cube and the time series cannot answer.
+        columns = metric_columns([name for name in names if name not in CUBE_METRICS and name not in SERIES_METRICS])
+        with telemetry.measure("filter"):
+            return read_range(store_dir("main_data.csv"), start_date, end_date, columns)
+    # Both ends of the range are whole days, matching the daily cube buckets.
+    with telemetry.measure("filter"):
+        return slice_dates(all_df, start_date, end_date)
+
+def compute_section(names, start_date, end_date):
+    if config.DATA_SOURCE == "sql":
+        # Every metric is a query that reads only its columns and the row
+        # groups in range, on DuckDB's threads.
+        return sql_backend.compute_metrics(parquet_dir, names, start_date, end_date)
+    filtered_data = filter_rows(names, start_date, end_date)
+    cache_path = cache_paths("main_data.csv")[0] if config.DATA_SOURCE == "cache" else None
+    return compute_metrics(filtered_data, names, daily_cube, start_date, end_date,
+                           cache_path=cache_path, series=timeseries)
+
+def cached_section(names):
+    # Results this session speculatively computed come first. Otherwise
+    # sessions asking for the same dataset version, range and metric share
+    # one result, and concurrent identical requests compute it once.
+    range_key = (fingerprint, start_date, end_date)
+    results = {}
+    for name in names:
+        found, value = prefetcher.get(range_key, name)
+        if found:
+            results[name] = value
+    keys = [range_key + (name,) for name in names if name not in results]
+
+    def compute_missing(missing):
+        computed = compute_section([key[3] for key in missing], start_date, end_date)
+        return {key: computed[key[3]] for key in missing}
+
+    values = result_cache.results.get_many(keys, compute_missing)
+    results.update((key[3], values[key]) for key in keys)
+    return {name: results[name] for name in names}
+
+def speculate(range_key, names):
+    # One metric at a time on the prefetch thread, so the prefetcher can
+    # stop between any two; in sql mode on the one-thread DuckDB database,
+    # whose work time.thread_time sees.
+    _, speculative_start, speculative_end = range_key
+    if config.DATA_SOURCE == "sql":
+        yield from sql_backend.iter_metrics(parquet_dir, names, speculative_start, speculative_end, threads=1)
+        return
+    filtered_data = filter_rows(names, speculative_start, speculative_end)
+    yield from iter_metrics(filtered_data, names, daily_cube, speculative_start, speculative_end,
+                            series=timeseries)
+
+metrics = LazyMetrics(
+    cached_section,
+    st.session_state.setdefault("tab_metrics", {}),
+    (fingerprint, start_date, end_date)
+)
+
+def show(figure):
+    draw, frames, params = figure
+    if config.CHART_BACKEND == "vega":
+        # Ships the aggregated rows and a spec; the browser draws the chart.
+        with telemetry.measure("chart:" + draw.__name__, "chart"):
+            data, spec = getattr(vega_charts, draw.__name__)(*frames, **params)
+        st.vega_lite_chart(data, spec)
+    else:
+        st.image(render(draw, *frames, **params))
+
+def is_open(tab):
+    # .open is None when the tab state is not tracked; draw everything then,
+    # and during the boot warm-up, where every tab reports closed.
+    return warmup.active.get() or getattr(tab, "open", None) is not False
 
 st.header('Brazilian E-Commerce Dashboard :sparkles:')
  
-tab1, tab2, tab3 = st.tabs(["Sales Performance Overview", "Sales Analysis", "Payment Preferences"])
+try:
+    # Tracking the selected tab reruns the script on a switch and lets the
+    # closed tabs skip their metrics and charts entirely.
+    tab1, tab2, tab3 = st.tabs(list(TAB_METRICS), key="tab", on_change="rerun")
+except TypeError:
+    tab1, tab2, tab3 = st.tabs(list(TAB_METRICS))
 
 with tab1:
-    col1, col2, col3 = st.columns(3)
+    if is_open(tab1):
+        with telemetry.measure("section:Sales Performance Overview"):
+            results = metrics["Sales Performance Overview"]
+        # The headline averages stay monthly; only the charts follow the
+        # selected granularity, and both come from the same running totals.
+        totals = timeseries.totals(start_date, end_date)
+        series = timeseries.window(start_date, end_date, granularity)
+        values = section_metrics("Sales Performance Overview", results, totals)
+        figures = section_charts("Sales Performance Overview", results, series=series,
+                                 period=GRANULARITIES[granularity][1])
+
+        col1, col2, col3 = st.columns(3)
  
-    with col1:
-        total_order = monthly_order['Total Orders'].sum()
-        st.metric("Total Orders", value=total_order)
+        with col1:
+            st.metric("Total Orders", value=values["Total Orders"])
     
-    with col2:
-        total_revenue = int(monthly_order['Total Revenue'].sum())
-        st.metric("Total Revenue", value=total_revenue)
-
-    with col3:
-        average_order_value = round(monthly_order['Average Order Value'].mean(), 2)
-        st.metric("Average Order Value", value=average_order_value)
-
-    st.subheader('Monthly Order in 2017-2018')
-
-    fig, ax = plt.subplots(figsize=(24,12))
-    ax.plot(
-        monthly_order['Months'],
-        monthly_order['Total Orders'],
-        marker='o',
-        linewidth=3,
-        color="#72BCD4"
-    )
-    ax.tick_params(axis='x', labelsize=14)
-    ax.tick_params(axis='y', labelsize=16)
-    st.pyplot(fig)
-
-    st.subheader('Monthly Revenue in 2017-2018')
-
-    fig, ax = plt.subplots(figsize=(24,12))
-    ax.plot(
-        monthly_order['Months'],
-        monthly_order['Total Revenue'],
-        marker='o',
-        linewidth=3,
-        color="#72BCD4"
-    )
-    ax.tick_params(axis='x', labelsize=14)
-    ax.tick_params(axis='y', labelsize=16)
-    st.pyplot(fig)
-
-    st.subheader('Monthly AOV in 2017-2018')
-
-    fig, ax = plt.subplots(figsize=(24,12))
-    ax.plot(
-        monthly_order['Months'],
-        monthly_order['Average Order Value'],
-        marker='o',
-        linewidth=3,
-        color="#72BCD4"
-    )
-    ax.tick_params(axis='x', labelsize=14)
-    ax.tick_params(axis='y', labelsize=16)
-    st.pyplot(fig)
+        with col2:
+            st.metric("Total Revenue", value=values["Total Revenue"])
 
-    col1, col2 = st.columns(2)
+        with col3:
+            st.metric("Average Order Value", value=values["Average Order Value"])
 
-    with col1:
-        customer_city_count = by_customer_city['customer_city'].nunique()
-        st.metric("Customer City", value=customer_city_count)
-    
-    with col2:
-        customer_state_count = by_customer_state['customer_state'].nunique()
-        st.metric("Customer State", value=customer_state_count)
-    
-    st.subheader('Regional Order Performance')
-
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(16,8))
-
-    colors_1 = ["#72BCD4", "#D3D3D3", "#D3D3D3", "#D3D3D3", "#D3D3D3"]
-
-    sns.barplot(x="customer_id", y="customer_city", data=by_customer_city.head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Orders", fontsize=15)
-    ax[0].set_title("Top 5 Cities by Order Volume", loc="center", fontsize=30)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="customer_id", y="customer_city", data=by_customer_city.sort_values(by="customer_id", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Orders", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("Bottom 5 Cities by Order Volume", loc="center", fontsize=30)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-
-    st.pyplot(fig)
-
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(16,8))
-
-    sns.barplot(x="customer_id", y="customer_state", data=by_customer_state.head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Orders", fontsize=15)
-    ax[0].set_title("Top 5 States by Order Volume", loc="center", fontsize=30)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="customer_id", y="customer_state", data=by_customer_state.sort_values(by="customer_id", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Orders", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("Bottom 5 States by Order Volume", loc="center", fontsize=30)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-        
-    st.pyplot(fig)
-
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        st.metric("Average Est. Delivery Time", value=round(mean_estimated_delivery_time, 2))
-
-    with col2:
-        st.metric("Average Delivery Time", value=round(mean_delivery_time, 2))
-
-    with col3:
-        st.metric("Late Deliveries", value=late_delivery)
-    
-    with col4:
-        average_shipping_cost = round(monthly_order['Average Shipping Cost per Order'].mean(), 2)
-        st.metric("Average Shipping Cost", value=average_shipping_cost)
-    
-    st.subheader('Monthly Average Shipping Cost per Order in 2017-2018')
-
-    fig, ax = plt.subplots(figsize=(24,12))
-    ax.plot(
-        monthly_order['Months'],
-        monthly_order['Average Shipping Cost per Order'],
-        marker='o',
-        linewidth=3,
-        color="#72BCD4"
-    )
-    ax.tick_params(axis='x', labelsize=14)
-    ax.tick_params(axis='y', labelsize=16)
-    st.pyplot(fig)
+        st.subheader(f'{granularity} Order in 2017-2018')
 
-with tab2:
-    col1, col2, col3 = st.columns(3)
+        show(figures["orders"])
 
-    with col1:
-        product_category_count = by_product_category['product_category_name'].nunique()
-        st.metric("Product Category", value=product_category_count)
-    
-    with col2:
-        seller_city_count = by_seller_city['seller_city'].nunique()
-        st.metric("Seller City", value=seller_city_count)
-    
-    with col3:
-        seller_state_count = by_seller_state['seller_state'].nunique()
-        st.metric("Seller State", value=seller_state_count)
-    
-    st.subheader('Product Performance Overview')
-
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(10,5))
-
-    sns.barplot(x="Total Orders", y="product_category_name", data=by_product_category.sort_values(by="Total Orders", ascending=False).head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Orders", fontsize=15)
-    ax[0].set_title("Top 5 Best-Sellers", loc="center", fontsize=20)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="Total Orders", y="product_category_name", data=by_product_category.sort_values(by="Total Orders", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Orders", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("Bottom 5 Worst-Sellers", loc="center", fontsize=20)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-        
-    st.pyplot(fig)
-    
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(10,5))
-
-    sns.barplot(x="Total Revenue", y="product_category_name", data=by_product_category.sort_values(by="Total Revenue", ascending=False).head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Revenue", fontsize=15)
-    ax[0].set_title("Highest Revenue Products", loc="center", fontsize=20)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="Total Revenue", y="product_category_name", data=by_product_category.sort_values(by="Total Revenue", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Revenue", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("Lowest Revenue Products", loc="center", fontsize=20)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-        
-    st.pyplot(fig)
-    
-    st.subheader('Regional Seller Performance')
-
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(12,6))
-
-    sns.barplot(x="seller_id", y="seller_city", data=by_seller_city.sort_values(by="seller_id", ascending=False).head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Sellers", fontsize=15)
-    ax[0].set_title("TOP 5 Seller Cites", loc="center", fontsize=20)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="seller_id", y="seller_city", data=by_seller_city.sort_values(by="seller_id", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Sellers", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("BOTTOM 5 Seller Cities", loc="center", fontsize=20)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-        
-    st.pyplot(fig)
-
-    fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(12,6))
-
-    sns.barplot(x="seller_id", y="seller_state", data=by_seller_state.sort_values(by="seller_id", ascending=False).head(5), palette=colors_1, ax=ax[0], legend=False)
-    ax[0].set_ylabel(None)
-    ax[0].set_xlabel("Total Sellers", fontsize=15)
-    ax[0].set_title("TOP 5 Seller States", loc="center", fontsize=20)
-    ax[0].tick_params(axis ='y', labelsize=12)
-
-    sns.barplot(x="seller_id", y="seller_state", data=by_seller_state.sort_values(by="seller_id", ascending=True).head(5), palette=colors_1, ax=ax[1], legend=False)
-    ax[1].set_ylabel(None)
-    ax[1].set_xlabel("Total Sellers", fontsize=15)
-    ax[1].invert_xaxis()
-    ax[1].yaxis.set_label_position("right")
-    ax[1].yaxis.tick_right()
-    ax[1].set_title("BOTTOM 5 Seller States", loc="center", fontsize=20)
-    ax[1].tick_params(axis='y', labelsize=12)
-
-    for i, bar in enumerate(ax[0].patches):
-        ax[0].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='right', color='black', fontsize=12)
-
-    for i, bar in enumerate(ax[1].patches):
-        ax[1].text(bar.get_width(), bar.get_y() + bar.get_height()/2, f'{int(bar.get_width())}',
-                    va='center', ha='left', color='black', fontsize=12)
-    
-    st.pyplot(fig)
+        st.subheader(f'{granularity} Revenue in 2017-2018')
 
-    st.subheader('Order Status Overview')
+        show(figures["revenue"])
 
-    fig = plt.figure(figsize=(16, 8))
+        st.subheader(f'{granularity} AOV in 2017-2018')
 
-    colors_5 = ["#72BCD4"] + ["#D3D3D3"] * 7
+        show(figures["aov"])
 
-    sns.barplot(
-        x="order_id", 
-        y="order_status",
-        data=by_order_status.sort_values(by="order_id", ascending=False),
-        palette=colors_5,
-        legend=False
-    )
-    plt.ylabel(None)
-    plt.xlabel("Total Orders", fontsize=15)
-    plt.tick_params(axis='y', labelsize=12)
+        col1, col2 = st.columns(2)
 
-    for i, value in enumerate(by_order_status["order_id"]):
-        plt.text(value, i, f' {value}', va='center', color='black')
-
-    st.pyplot(fig)
+        with col1:
+            st.metric("Customer City", value=values["Customer City"])
     
-    st.subheader('Customer Reviews')
-
-    by_review["review_score"] = by_review["review_score"].astype(int)
+        with col2:
+            st.metric("Customer State", value=values["Customer State"])
+    
+        st.subheader('Regional Order Performance')
 
-    fig = plt.figure()
+        show(figures["customer_city"])
 
-    colors_4 = ["#D3D3D3", "#D3D3D3", "#D3D3D3", "#D3D3D3", "#72BCD4"]
+        show(figures["customer_state"])
 
-    sns.barplot(x="review_score", y="order_id", data=by_review, palette=colors_4, legend=False)
-    plt.ylabel("Total Orders", fontsize=15)
-    plt.xlabel(None)
-    plt.tick_params(axis='x', labelsize=12)
+        col1, col2, col3, col4 = st.columns(4)
 
-    for i, value in enumerate(by_review["order_id"]):
-        plt.text(i, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
+        with col1:
+            st.metric("Average Est. Delivery Time", value=values["Average Est. Delivery Time"])
 
-    st.pyplot(fig)
+        with col2:
+            st.metric("Average Delivery Time", value=values["Average Delivery Time"])
 
-    st.subheader('RFM Analysis')
+        with col3:
+            st.metric("Late Deliveries", value=values["Late Deliveries"])
     
-    col1, col2, col3 = st.columns(3)
-
-    with col1:
-        average_recency = round(rfm['recency'].mean(), 2)
-        st.metric("Average Recency", value=average_recency)
-
-    with col2:
-        average_frequency = round(rfm['frequency'].mean(), 2)
-        st.metric("Average Frequency", value=average_frequency)
-
-    with col3:
-        average_monetary = round(rfm['monetary'].mean(), 2)
-        st.metric("Average Monetary", value=average_monetary)
+        with col4:
+            st.metric("Average Shipping Cost", value=values["Average Shipping Cost"])
     
-    rfm['customer_unique_id'] = rfm['customer_unique_id'].str[:3] + ".." + rfm['customer_unique_id'].str[-3:]
+        st.subheader(f'{granularity} Average Shipping Cost per Order in 2017-2018')
 
-    fig = plt.figure(figsize= (15,5))
+        show(figures["shipping"])
 
-    colors_6 = ["#72BCD4"] * 10
+with tab2:
+    if is_open(tab2):
+        with telemetry.measure("section:Sales Analysis"):
+            results = metrics["Sales Analysis"]
 
-    sns.barplot(y="recency", x="customer_unique_id", data=rfm.sort_values(by="recency", ascending=True).head(10), palette=colors_6, legend=False)
-    plt.title("Customer by Recency (days)", fontsize=25)
-    plt.ylabel(None)
-    plt.xlabel("Customer Unique ID", fontsize=15)
-    plt.ylim(0)
-    plt.tick_params(axis='x', labelsize=12)
+        def rfm_summary():
+            rfm_window = st.session_state.get("rfm_window")
+            if rfm_window is None or rfm_window.index is not rfm_index:
+                rfm_window = st.session_state["rfm_window"] = RFMWindow(rfm_index)
+            return rfm_window.summary(start_date, end_date)
 
-    st.pyplot(fig)
+        with telemetry.measure("rfm_window"):
+            rfm = result_cache.results.get((fingerprint, start_date, end_date, "rfm_summary"), rfm_summary)
+        values = section_metrics("Sales Analysis", results, rfm=rfm)
+        figures = section_charts("Sales Analysis", results, rfm=rfm)
 
-    rfm['customer_unique_id'] = rfm['customer_unique_id'].str[:3] + ".." + rfm['customer_unique_id'].str[-3:]
+        col1, col2, col3 = st.columns(3)
 
-    fig = plt.figure(figsize= (15,5))
+        with col1:
+            st.metric("Product Category", value=values["Product Category"])
+    
+        with col2:
+            st.metric("Seller City", value=values["Seller City"])
+    
+        with col3:
+            st.metric("Seller State", value=values["Seller State"])
+    
+        st.subheader('Product Performance Overview')
 
-    ax = sns.barplot(y="frequency", x="customer_unique_id", data=rfm.sort_values(by="frequency", ascending=False).head(10), palette=colors_6, legend=False)
-    plt.title("Customer by Frequency", fontsize=25)
-    plt.ylabel(None)
-    plt.xlabel("Customer Unique ID", fontsize=15)
-    plt.ylim(0)
-    plt.tick_params(axis='x', labelsize=12)
+        show(figures["category_orders"])
 
-    for i, p in enumerate(ax.patches):
-        ax.annotate(f'{p.get_height():.0f}', (p.get_x() + p.get_width() / 2., p.get_height()), ha='center', va='bottom', fontsize=10, color='black')
+        show(figures["category_revenue"])
+    
+        st.subheader('Regional Seller Performance')
 
-    st.pyplot(fig)
+        show(figures["seller_city"])
 
-    rfm['customer_unique_id'] = rfm['customer_unique_id'].str[:3] + ".." + rfm['customer_unique_id'].str[-3:]
+        show(figures["seller_state"])
 
-    rfm["monetary"] = rfm["monetary"].astype(int)
+        st.subheader('Order Status Overview')
 
-    fig = plt.figure(figsize= (16,8))
+        show(figures["order_status"])
+    
+        st.subheader('Customer Reviews')
 
-    sns.barplot(y="monetary", x="customer_unique_id", data=rfm.sort_values(by="monetary", ascending=False).head(10), palette=colors_6, legend=False)
-    plt.title("Customer by Monetary", fontsize=25)
-    plt.ylabel(None)
-    plt.xlabel("Customer Unique ID", fontsize=15)
-    plt.ylim(0)
-    plt.tick_params(axis='x', labelsize=12)
+        show(figures["review"])
 
-    for i, v in enumerate(rfm.sort_values(by="monetary", ascending=False).head(10)['monetary']):
-        plt.text(i, v + 10, str(v), color='#333333', ha='center', va='bottom', fontsize=10)
+        st.subheader('RFM Analysis')
     
-    st.pyplot(fig)
+        col1, col2, col3 = st.columns(3)
 
-with tab3:
-    st.subheader('Payment Sequentials')
+        with col1:
+            st.metric("Average Recency", value=values["Average Recency"])
 
-    st.write('A customer may pay for an order with more than one payment method. If they do so, a sequence will be created.')
+        with col2:
+            st.metric("Average Frequency", value=values["Average Frequency"])
 
-    by_payment_sequential['payment_sequential'] = by_payment_sequential['payment_sequential'].astype(int)
+        with col3:
+            st.metric("Average Monetary", value=values["Average Monetary"])
     
-    fig = plt.figure(figsize=(18,9))
+        show(figures["recency"])
 
-    colors_2 = ["#72BCD4"] + ["#D3D3D3"] * 28
+        show(figures["frequency"])
 
-    sns.barplot(x="payment_sequential", y="order_id", data=by_payment_sequential, palette=colors_2, legend=False)
-    plt.ylabel("Total Orders", fontsize=15)
-    plt.xlabel(None)
-    plt.tick_params(axis='x', labelsize=12)
+        show(figures["monetary"])
 
-    for i, value in enumerate(by_payment_sequential["order_id"]):
-        plt.text(i, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
-
-    st.pyplot(fig)
+with tab3:
+    if is_open(tab3):
+        with telemetry.measure("section:Payment Preferences"):
+            results = metrics["Payment Preferences"]
+        figures = section_charts("Payment Preferences", results)
 
-    st.subheader('Payment Types')
+        st.subheader('Payment Sequentials')
 
-    fig = plt.figure(figsize=(9,9))
+        st.write('A customer may pay for an order with more than one payment method. If they do so, a sequence will be created.')
     
-    plt.pie(
-    x=by_payment_type["order_id"],
-    labels=by_payment_type["payment_type"],
-    autopct='%1.1f%%')
-    
-    st.pyplot(fig)
+        show(figures["payment_sequential"])
 
-    st.subheader('Payment Installments')
+        st.subheader('Payment Types')
 
-    by_payment_installment['payment_installments'] = by_payment_installment['payment_installments'].astype(int)
-    by_payment_installment = by_payment_installment.sort_values(by="order_id", ascending=False)
-    sort_payment_installment = by_payment_installment['payment_installments'].tolist()
+        show(figures["payment_type"])
 
-    fig = plt.figure(figsize=(16,8))
+        st.subheader('Payment Installments')
 
-    colors_3 = ["#72BCD4"] + ["#D3D3D3"] * 22
+        show(figures["payment_installment"])
 
-    sns.barplot(x="payment_installments", y="order_id", data=by_payment_installment, palette=colors_3, order=sort_payment_installment, legend=False)
-    plt.ylabel("Total Orders", fontsize=15)
-    plt.xlabel(None)
-    plt.tick_params(axis='x', labelsize=12)
+if config.PREFETCH_CPU_MS and not warmup.active.get():
+    # The tabs drawn this rerun are the ones worth speculating for.
+    open_names = [name for section, tab in zip(TAB_METRICS, [tab1, tab2, tab3]) if is_open(tab)
+                  for name in TAB_METRICS[section]]
+    prefetcher.start(
+        [(fingerprint,) + date_range for date_range in adjacent_ranges(start_date, end_date, min_date, max_date)],
+        open_names,
+        speculate
+    )
 
-    for i, value in enumerate(by_payment_installment["order_id"], start=1):
-        plt.text(i - 1, value, f' {value}', va='bottom', ha='center', color='black', fontsize=10)
+telemetry.record("rerun", "rerun", time.perf_counter() - rerun_start)
+telemetry.write_prometheus()
 
-    st.pyplot(fig)
\ No newline at end of file
+if profile is not None:
+    with st.sidebar.expander("Profile"):
+        st.caption("This rerun")
+        st.dataframe(profile.frame(), hide_index=True)
+        st.caption("All sessions, recent reruns")
+        st.dataframe(telemetry.registry.percentiles(), hide_index=True)
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from delivery import add_delivery_columns
+from schema import apply_schema, concat_categorical, read_dtypes
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+CACHE_DIR = ".cache"
+# Bump whenever read_source_csv changes what ends up in the cache.
+CACHE_VERSION = 5
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(path, chunk_size=1 << 20, limit=None):
+    # sha256 of the whole file, or of its first limit bytes.
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def source_meta(path, size=None):
+    # What the caches need to know about the CSV they were built from,
+    # including what it takes to parse rows appended to it later. size is
+    # how much of it was parsed when that was less than the whole file.
+    mtime_ns, file_size = source_fingerprint(path)
+    size = file_size if size is None else size
+    with open(path, "rb") as f:
+        f.seek(max(size - 1, 0))
+        ends_with_newline = f.read(1) == b"\n"
+    return {
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "sha256": file_hash(path, limit=size),
+        "columns": pd.read_csv(path, nrows=0).columns.tolist(),
+        "ends_with_newline": ends_with_newline
+    }
+
+
+def appended_since(path, meta):
+    # True when path is the file meta describes with whole rows added after
+    # it, so only the bytes from meta["size"] on need parsing.
+    if not meta.get("ends_with_newline") or os.path.getsize(path) <= meta["size"]:
+        return False
+    return file_hash(path, limit=meta["size"]) == meta["sha256"]
+
+
+def whole_rows_end(path, offset):
+    # Just past the last newline of path after offset, or offset if there is
+    # none. A row a writer is still appending is left for the next read.
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > offset:
+            start = max(offset, end - (1 << 16))
+            f.seek(start)
+            found = f.read(end - start).rfind(b"\n")
+            if found >= 0:
+                return start + found + 1
+            end = start
+    return offset
+
+
+class Bounded:
+    # A binary file that reads as if it ended at stop.
+
+    def __init__(self, f, stop):
+        self.f = f
+        self.remaining = stop - f.tell()
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def csv_reader(f, columns=None, chunksize=None):
+    # With columns, f is positioned past the header, e.g. at an append offset.
+    return pd.read_csv(f, dtype=read_dtypes(), chunksize=chunksize,
+                       names=columns, header=None if columns else "infer")
+
+
+def sort_rows(df):
+    df.sort_values(by="order_purchase_timestamp", inplace=True, kind="mergesort")
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def read_source_csv(path):
+    df = sort_rows(apply_schema(csv_reader(path)))
+    return add_delivery_columns(df)
+
+
+def read_appended_rows(path, offset, stop, columns):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return add_delivery_columns(apply_schema(csv_reader(Bounded(f, stop), columns)))
+
+
+def append_rows(df, delta):
+    # Same frame read_source_csv would give for the longer file: the sort is
+    # stable and the old rows come first, exactly as they do in the file.
+    columns = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and isinstance(delta[column].dtype, pd.CategoricalDtype):
+            columns[column] = concat_categorical(df[column], delta[column])
+        else:
+            columns[column] = pd.concat([df[column], delta[column]], ignore_index=True)
+    df = pd.DataFrame(columns)
+    timestamps = df['order_purchase_timestamp'].to_numpy()
+    if len(delta) and not (timestamps[1:] >= timestamps[:-1]).all():
+        sort_rows(df)
+    return df
+
+
+def day_bounds(timestamps, start_date=None, end_date=None):
+    # Positions of the rows purchased on start_date through the whole of
+    # end_date in an ascending datetime64[ns] array. Comparing as datetime64
+    # rather than int64 keeps NaT, which the sort puts last, after every date.
+    start = 0 if start_date is None else np.searchsorted(timestamps, pd.Timestamp(start_date).to_datetime64())
+    if end_date is None:
+        return int(start), len(timestamps)
+    stop = np.searchsorted(timestamps, (pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_datetime64())
+    return int(start), int(stop)
+
+
+def slice_dates(df, start_date, end_date):
+    # The frame is sorted by purchase time, so a date range is one run of
+    # rows: two binary searches and a positional slice that shares the
+    # frame's column buffers instead of copying them through a mask.
+    start, stop = day_bounds(df['order_purchase_timestamp'].to_numpy(), start_date, end_date)
+    return df.iloc[start:stop]
+
+
+def cache_paths(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), cache_dir)
+    return os.path.join(cache_dir, stem + ".feather"), os.path.join(cache_dir, stem + ".meta.json")
+
+
+def read_cache(cache_path):
+    # Uncompressed Feather can be memory-mapped, so numeric columns come back
+    # as views on the page cache instead of freshly parsed copies.
+    table = feather.read_table(cache_path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def write_cache(df, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+
+
+def read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def merge_appended(path, df, meta, cache_dir=CACHE_DIR):
+    # df, the frame of the file meta describes, with the rows appended to
+    # path since then parsed and merged in; the Feather cache is updated to
+    # match. Returns the merged frame, the new rows and the new meta. Only
+    # whole rows are merged; the new meta ends after the last of them.
+    stop = whole_rows_end(path, meta["size"])
+    if stop == meta["size"]:
+        return df, df.iloc[:0], meta
+    delta = read_appended_rows(path, meta["size"], stop, meta["columns"])
+    df = append_rows(df, delta)
+    meta = dict(source_meta(path, stop), version=CACHE_VERSION)
+    if feather is not None:
+        cache_path, meta_path = cache_paths(path, cache_dir)
+        write_cache(df, cache_path)
+        write_meta(meta_path, meta)
+    return df, delta, meta
+
+
+def load_with_meta(path="main_data.csv", cache_dir=CACHE_DIR):
+    # The frame and the meta of the file it was read from, which
+    # merge_appended needs later. Without pyarrow there is no cache and no
+    # meta, so every change to the file is read afresh.
+    if feather is None:
+        return read_source_csv(path), None
+
+    cache_path, meta_path = cache_paths(path, cache_dir)
+    mtime_ns, size = source_fingerprint(path)
+    meta = read_meta(meta_path)
+
+    if meta and meta.get("version") == CACHE_VERSION and os.path.exists(cache_path):
+        if meta["mtime_ns"] == mtime_ns and meta["size"] == size:
+            return read_cache(cache_path), meta
+        # The file was touched; only rebuild if its content actually changed.
+        if meta["size"] == size and meta["sha256"] == file_hash(path):
+            meta = dict(meta, mtime_ns=mtime_ns)
+            write_meta(meta_path, meta)
+            return read_cache(cache_path), meta
+
+        # Rows were appended: parse just those and merge them into the cache.
+        if appended_since(path, meta):
+            df, _, meta = merge_appended(path, read_cache(cache_path), meta, cache_dir)
+            return df, meta
+
+    df = read_source_csv(path)
+    meta = dict(source_meta(path), version=CACHE_VERSION)
+    write_cache(df, cache_path)
+    write_meta(meta_path, meta)
+    return df, meta
+
+
+def load_all_df(path="main_data.csv", cache_dir=CACHE_DIR):
+    return load_with_meta(path, cache_dir)[0]
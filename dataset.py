@@ -0,0 +1,79 @@
+import pandas as pd
+
+from cube import build_daily_cube, crossing_ids, cube_pair_ids, extend_cube
+from data_loader import appended_since, day_bounds, load_with_meta, merge_appended
+from ingest import iter_months, month_parts, read_store_meta, store_dir
+from planner import METRIC_COLUMNS
+from rfm_engine import RFMIndex, concat_rows, extend_rows, rfm_rows
+from timeseries import TimeSeries, daily_totals, extend_series
+
+
+def build_dataset(df, meta):
+    return {
+        "df": df,
+        "meta": meta,
+        "cube": build_daily_cube(df),
+        "rfm_index": RFMIndex(rfm_rows(df)),
+        "timeseries": TimeSeries(*daily_totals(df))
+    }
+
+
+def extend_dataset(previous, df, meta, first_day):
+    # Everything before first_day is unchanged, so only the rows from that
+    # day on are summarized; for rows appended to the file these are the
+    # new rows plus any old ones that share their days.
+    start, _ = day_bounds(df['order_purchase_timestamp'].to_numpy(), first_day)
+    tail = df.iloc[start:]
+    # The tail keeps pairs for the same IDs as the cube it extends, plus any
+    # whose IDs now recur across days. Those need pairs for the old rows too.
+    pair_ids = cube_pair_ids(previous["cube"])
+    tail_cube = build_daily_cube(tail, pair_ids | crossing_ids(df, start))
+    if cube_pair_ids(tail_cube) == pair_ids:
+        cube = extend_cube(previous["cube"], tail_cube)
+    else:
+        cube = build_daily_cube(df, cube_pair_ids(tail_cube))
+    return {
+        "df": df,
+        "meta": meta,
+        "cube": cube,
+        "rfm_index": RFMIndex(extend_rows(previous["rfm_index"], rfm_rows(tail))),
+        "timeseries": extend_series(previous["timeseries"], *daily_totals(tail))
+    }
+
+
+def load_dataset(path="main_data.csv", previous=None):
+    # The frame of path with the daily cube, RFM index and time series the
+    # dashboard builds from it. previous is the dataset of an older version
+    # of the file: if rows were only appended since, they are merged into
+    # its frame and its structures are extended rather than rebuilt.
+    if previous is not None and previous["meta"] and appended_since(path, previous["meta"]):
+        df, delta, meta = merge_appended(path, previous["df"], previous["meta"])
+        if not len(delta):
+            return dict(previous, df=df, meta=meta)
+        first_day = delta['order_purchase_timestamp'].min()
+        if pd.isna(first_day):
+            # Only rows without a purchase time, which no day boundary splits.
+            return build_dataset(df, meta)
+        return extend_dataset(previous, df, meta, first_day.normalize())
+    return build_dataset(*load_with_meta(path))
+
+
+def load_store_rfm_index(path="main_data.csv", previous=None):
+    # The RFM index of the store of path, read one month at a time, with the
+    # store_id and part files it was read from. previous is that state for
+    # an older version of the store: after appends, only the months from
+    # the first one that gained part files on are read again.
+    directory = store_dir(path)
+    store_id = (read_store_meta(directory) or {}).get("store_id")
+    parts = month_parts(directory)
+    months = list(parts)
+    if previous is not None and store_id is not None and previous["store_id"] == store_id:
+        changed = [month for month in months if previous["parts"].get(month) != parts[month]]
+        if not changed:
+            return dict(previous, parts=parts)
+        tail = concat_rows(rfm_rows(df) for df in iter_months(directory, METRIC_COLUMNS["rfm"],
+                                                              [month for month in months if month >= changed[0]]))
+        index = RFMIndex(extend_rows(previous["index"], tail))
+    else:
+        index = RFMIndex(concat_rows(rfm_rows(df) for df in iter_months(directory, METRIC_COLUMNS["rfm"])))
+    return {"store_id": store_id, "parts": parts, "index": index}
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86400 * 10**9
+NAT = np.iinfo(np.int64).min
+
+# Derived per-row columns added at load time; every statistic below reads
+# these instead of re-parsing and re-subtracting the timestamps.
+DELIVERY_COLUMNS = ['delivery_time', 'estimated_delivery_time', 'is_late']
+
+
+def duration_days(start, end):
+    # Whole days between two datetime64[ns] columns, NaN where either is NaT.
+    start = start.to_numpy("datetime64[ns]").view(np.int64)
+    end = end.to_numpy("datetime64[ns]").view(np.int64)
+    days = np.rint((end - start) / NS_PER_DAY).astype(np.float32)
+    days[(start == NAT) | (end == NAT)] = np.nan
+    return days
+
+
+def add_delivery_columns(df):
+    purchased = df['order_purchase_timestamp']
+    delivered = df['order_delivered_customer_date']
+    estimated = df['order_estimated_delivery_date']
+    delivery_time = duration_days(purchased, delivered)
+    estimated_delivery_time = duration_days(purchased, estimated)
+    df['delivery_time'] = delivery_time
+    df['estimated_delivery_time'] = estimated_delivery_time
+    # Late means more whole days than promised, as the dashboard always
+    # counted it. The promised date is a midnight, so comparing timestamps
+    # would make every order delivered during that day late. NaN compares
+    # false, so undelivered orders are not late.
+    df['is_late'] = delivery_time > estimated_delivery_time
+    return df
+
+
+def mean_days(df, column):
+    days = df[column].to_numpy()
+    known = days[~np.isnan(days)]
+    return known.mean(dtype=np.float64) if len(known) else np.nan
+
+
+def late_count(df):
+    return int(df['is_late'].to_numpy().sum())
+
+
+def delivery_stats(df, percentiles=(50, 90, 95)):
+    days = df['delivery_time'].to_numpy()
+    delivered = days[~np.isnan(days)]
+    if len(delivered):
+        values = np.percentile(delivered, percentiles)
+    else:
+        values = [np.nan] * len(percentiles)
+    late = late_count(df)
+    return {
+        "mean_delivery_time": mean_days(df, 'delivery_time'),
+        "mean_estimated_delivery_time": mean_days(df, 'estimated_delivery_time'),
+        "delivery_percentiles": pd.Series(values, index=list(percentiles), name="delivery_time"),
+        "late_delivery": late,
+        "late_rate": late / len(delivered) if len(delivered) else np.nan
+    }
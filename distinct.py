@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Above this many (group, id) slots the bitmap costs more memory than a sort.
+BITMAP_LIMIT = 1 << 24
+
+
+def column_codes(series):
+    # The schema loads IDs and labels as categoricals, so their codes are the
+    # load-time factorization and cost nothing here.
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(np.int64), series.cat.categories
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype(np.int64), pd.Index(uniques)
+
+
+def merge_labels(labels, more):
+    # Sorted, unique labels and more such labels as their sorted union, plus
+    # where each side's labels land in it. Only more is searched for in
+    # labels, so when more is the short side (labels seen in appended rows)
+    # labels are never hashed or compared as a whole.
+    values = np.asarray(labels, dtype=object)
+    more = np.asarray(more, dtype=object)
+    found = np.searchsorted(values, more)
+    present = found < len(values)
+    present[present] = values[found[present]] == more[present]
+    inserts = found[~present]
+    if not len(inserts):
+        return labels, np.arange(len(values)), found
+    labels_at = np.arange(len(values)) + np.searchsorted(inserts, np.arange(len(values)), side="right")
+    more_at = np.empty(len(more), dtype=np.int64)
+    more_at[present] = labels_at[found[present]]
+    more_at[~present] = inserts + np.arange(len(inserts))
+    return pd.Index(np.insert(values, inserts, more[~present]), dtype=labels.dtype), labels_at, more_at
+
+
+def count_distinct(key_codes, n_keys, id_codes, n_ids):
+    # Returns distinct id counts per key code and the key codes that occur at
+    # all. Like groupby(...).nunique(), missing keys are dropped and missing
+    # ids are not counted but still make their key observed.
+    n_ids = max(n_ids, 1)
+    # Boolean indexing copies every column, so only pay for it when needed.
+    if (key_codes < 0).any():
+        keep = key_codes >= 0
+        key_codes, id_codes = key_codes[keep], id_codes[keep]
+    observed = np.flatnonzero(np.bincount(key_codes, minlength=n_keys))
+
+    if (id_codes < 0).any():
+        valid = id_codes >= 0
+        key_codes, id_codes = key_codes[valid], id_codes[valid]
+    pairs = key_codes * n_ids + id_codes
+    if n_keys * n_ids <= BITMAP_LIMIT:
+        bitmap = np.zeros(n_keys * n_ids, dtype=bool)
+        bitmap[pairs] = True
+        counts = bitmap.reshape(n_keys, n_ids).sum(axis=1)
+    else:
+        counts = np.bincount(np.unique(pairs) // n_ids, minlength=n_keys)
+    return counts.astype(np.int64), observed
+
+
+def nunique_series(key_codes, labels, id_codes, n_ids, by, column):
+    counts, observed = count_distinct(key_codes, len(labels), id_codes, n_ids)
+    return pd.Series(counts[observed], index=pd.Index(labels.take(observed), name=by), name=column)
+
+
+def grouped_nunique(df, by, column):
+    key_codes, labels = column_codes(df[by])
+    id_codes, id_labels = column_codes(df[column])
+    return nunique_series(key_codes, labels, id_codes, len(id_labels), by, column)
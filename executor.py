@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import config
+import telemetry
+from cube import CUBE_METRICS, query_cube
+from data_loader import read_cache
+from planner import METRICS, SharedColumns
+from timeseries import SERIES_METRICS
+
+# Metrics that reuse the same SharedColumns intermediates run as one task so
+# parallelism does not undo the planner's sharing.
+TASK_GROUPS = [
+    ["by_payment_sequential", "by_payment_type", "by_payment_installment", "by_review",
+     "by_order_status", "by_product_category"],
+    ["by_customer_city", "by_customer_state"],
+    ["by_seller_city", "by_seller_state"],
+    ["mean_estimated_delivery_time", "mean_delivery_time", "late_delivery", "delivery_stats"],
+    ["monthly_order"],
+    ["rfm"]
+]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Frames memory-mapped by a process worker, keyed by (cache path, mtime).
+_worker_frames = {}
+
+
+def get_pool(kind, workers):
+    # One pool per kind for the whole process, shared by every session.
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == "process":
+                # spawn, not fork: the Streamlit server is multi-threaded.
+                _pools[kind] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _pools[kind] = ThreadPoolExecutor(workers, thread_name_prefix="metrics")
+        return _pools[kind]
+
+
+def run_group(df, names):
+    shared = SharedColumns(df)
+    results, timings = {}, {}
+    for name in names:
+        start = time.perf_counter()
+        results[name] = METRICS[name](shared)
+        timings[name] = time.perf_counter() - start
+    return results, timings
+
+
+def run_group_from_cache(cache_path, start_row, stop_row, names):
+    key = (cache_path, os.stat(cache_path).st_mtime_ns)
+    if key not in _worker_frames:
+        _worker_frames.clear()
+        _worker_frames[key] = read_cache(cache_path)
+    return run_group(_worker_frames[key].iloc[start_row:stop_row], names)
+
+
+def row_range(df):
+    # The loader sorts and renumbers the frame, so a date filter over it is a
+    # contiguous run of labels that a worker can slice from its own copy.
+    if df.empty:
+        return None
+    start_row, stop_row = int(df.index[0]), int(df.index[-1]) + 1
+    return (start_row, stop_row) if stop_row - start_row == len(df) else None
+
+
+def task_groups(names):
+    wanted = set(names)
+    groups = [[name for name in group if name in wanted] for group in TASK_GROUPS]
+    grouped = {name for group in groups for name in group}
+    groups.extend([name] for name in names if name not in grouped)
+    return [group for group in groups if group]
+
+
+def iter_metrics(df, metrics, cube=None, start_date=None, end_date=None, series=None):
+    # compute_metrics one metric at a time on the calling thread, yielded as
+    # (name, value), so the caller can stop between any two. The metrics
+    # still share one SharedColumns over df.
+    shared = SharedColumns(df)
+    for name in metrics:
+        start = time.perf_counter()
+        if cube is not None and name in CUBE_METRICS:
+            value = query_cube(cube, start_date, end_date, [name])[name]
+        elif series is not None and name in SERIES_METRICS:
+            value = series.window(start_date, end_date)
+        else:
+            value = METRICS[name](shared)
+        telemetry.record("metric:" + name, "metric", time.perf_counter() - start)
+        yield name, value
+
+
+def compute_metrics(df, metrics, cube=None, start_date=None, end_date=None,
+                    cache_path=None, workers=None, timings=None, series=None):
+    workers = config.WORKERS if workers is None else workers
+    timings = {} if timings is None else timings
+    results = {}
+
+    if cube is not None:
+        start = time.perf_counter()
+        results.update(query_cube(cube, start_date, end_date, [name for name in metrics if name in CUBE_METRICS]))
+        timings["cube"] = time.perf_counter() - start
+
+    if series is not None:
+        start = time.perf_counter()
+        results.update((name, series.window(start_date, end_date)) for name in metrics if name in SERIES_METRICS)
+        timings["series"] = time.perf_counter() - start
+
+    groups = task_groups([name for name in metrics if name not in results])
+    if workers <= 1 or len(groups) <= 1 or len(df) < config.PARALLEL_MIN_ROWS:
+        group_results, group_timings = run_group(df, [name for group in groups for name in group])
+        results.update(group_results)
+        timings.update(group_timings)
+    else:
+        rows = row_range(df)
+        if config.EXECUTOR == "process" and cache_path and os.path.exists(cache_path) and rows:
+            pool = get_pool("process", workers)
+            futures = [pool.submit(run_group_from_cache, cache_path, *rows, group) for group in groups]
+        else:
+            pool = get_pool("thread", workers)
+            futures = [pool.submit(run_group, df, group) for group in groups]
+        for future in futures:
+            group_results, group_timings = future.result()
+            results.update(group_results)
+            timings.update(group_timings)
+
+    for name, seconds in timings.items():
+        telemetry.record("metric:" + name, "metric", seconds)
+    return {name: results[name] for name in metrics}
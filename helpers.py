@@ -0,0 +1,103 @@
+import pandas as pd
+
+from delivery import late_count, mean_days
+from distinct import grouped_nunique
+
+def drop_categories(df, column):
+    # Seaborn plots every category of a categorical axis, including ones the
+    # current date range never saw, so hand it plain labels instead.
+    if isinstance(df[column].dtype, pd.CategoricalDtype):
+        df[column] = df[column].astype(df[column].cat.categories.dtype)
+    return df
+
+def create_by_customer_city(df):
+    by_customer_city = grouped_nunique(df, "customer_city", "customer_id").sort_values(ascending=False).reset_index()
+    return by_customer_city
+
+def create_by_customer_state(df):
+    by_customer_state = grouped_nunique(df, "customer_state", "customer_id").sort_values(ascending=False).reset_index()
+    return by_customer_state
+
+def create_by_payment_sequential(df):
+    by_payment_sequential = grouped_nunique(df, "payment_sequential", "order_id").sort_values(ascending=False).reset_index()
+    return by_payment_sequential
+
+def create_by_payment_type(df):
+    by_payment_type = grouped_nunique(df, "payment_type", "order_id").sort_values(ascending=False).reset_index()
+    return by_payment_type
+
+def create_by_payment_installment(df):
+    by_payment_installment = grouped_nunique(df, "payment_installments", "order_id").sort_values(ascending=False).reset_index()
+    return by_payment_installment
+
+def create_by_review(df):
+    by_review = grouped_nunique(df, "review_score", "order_id").reset_index()
+    return by_review
+
+def create_by_order_status(df):
+    by_order_status = grouped_nunique(df, "order_status", "order_id").sort_values(ascending=False).reset_index()
+    return by_order_status
+
+def create_estimated_delivery_time(df):
+    mean_estimated_delivery_time = mean_days(df, 'estimated_delivery_time')
+    return mean_estimated_delivery_time
+
+def create_delivery_time(df):
+    mean_delivery_time = mean_days(df, 'delivery_time')
+    return mean_delivery_time
+
+def create_late_delivery_time(df):
+    late_delivery = late_count(df)
+    return late_delivery
+
+def create_monthly_order(df):
+    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
+    monthly_order = df.resample(rule='M', on='order_purchase_timestamp').agg({
+    "order_id" : "nunique",
+    "price" : "sum",
+    "freight_value" : "mean"
+    })
+    monthly_order.index = monthly_order.index.strftime('%Y-%m')
+    monthly_order = monthly_order.reset_index()
+    monthly_order.rename(columns={
+    "order_purchase_timestamp" : "Months",
+    "order_id" : "Total Orders",
+    "price" : "Total Revenue",
+    "freight_value" : "Average Shipping Cost per Order"
+    }, inplace=True)
+    monthly_order['average_order_value'] = monthly_order['Total Revenue'] / monthly_order['Total Orders']
+    monthly_order.rename(columns={"average_order_value" : "Average Order Value"}, inplace=True)
+    return monthly_order
+
+def create_rfm(df):
+    df = df.assign(order_purchase_timestamp=pd.to_datetime(df['order_purchase_timestamp'])).reset_index(drop=True)
+    rfm = df.groupby(by="customer_unique_id", as_index=False, observed=True).agg({
+    "order_purchase_timestamp": "max",
+    "order_id": "nunique",
+    "price": "sum"
+    })
+    rfm.columns = ["customer_unique_id", "max_order_timestamp", "frequency", "monetary"]
+    recent_date = df['order_purchase_timestamp'].max()
+    rfm['recency'] = (recent_date - rfm['max_order_timestamp']).dt.days
+    rfm.drop("max_order_timestamp", axis=1, inplace=True)
+    return rfm
+
+def create_by_product_category(df):
+    by_product_category = df.groupby(by="product_category_name", observed=True).agg({
+    "price" : "sum"
+    })
+    by_product_category.insert(0, "order_id", grouped_nunique(df, "product_category_name", "order_id").to_numpy())
+    by_product_category = by_product_category.reset_index()
+    by_product_category.rename(columns={
+    "order_id" : "Total Orders",
+    "price" : "Total Revenue"
+    }, inplace=True)
+    return drop_categories(by_product_category, "product_category_name")
+
+def create_by_seller_city(df):
+    by_seller_city = grouped_nunique(df, "seller_city", "seller_id").sort_values(ascending=False).reset_index()
+    return by_seller_city
+
+def create_by_seller_state(df):
+    by_seller_state = grouped_nunique(df, "seller_state", "seller_id").sort_values(ascending=False).reset_index()
+    return by_seller_state
@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from cube import DIMENSIONS, ORDER_IDS, build_daily_cube, cube_pair_ids, id_hashes, merge_cubes
+from data_loader import (CACHE_DIR, Bounded, appended_since, csv_reader, day_bounds, file_hash,
+                         source_fingerprint, source_meta, whole_rows_end, write_meta)
+from delivery import add_delivery_columns
+from schema import apply_schema
+from timeseries import daily_totals, merge_daily
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+except ImportError:
+    pa = pc = feather = None
+
+# Rows parsed at a time. Peak memory is a few chunks' worth of typed rows or
+# the summary columns of the largest month, whichever is bigger.
+CHUNK_ROWS = 250000
+# Bump whenever the partition layout or what is summarized per month changes.
+STORE_VERSION = 8
+
+# What each month's summary is built from: the cube's dimensions and IDs,
+# and the time series' order IDs, prices and freight values.
+SUMMARY_COLUMNS = sorted(set(DIMENSIONS) | set(DIMENSIONS.values()) | {'price', 'freight_value'})
+
+
+def iter_chunks(path, chunksize=CHUNK_ROWS, offset=0, columns=None, stop=None):
+    # Typed chunks in file order, from offset bytes in (columns then names
+    # the headerless rows) up to stop. Each chunk gets its own categoricals;
+    # the codes are only meaningful within that chunk.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for chunk in csv_reader(f if stop is None else Bounded(f, stop), columns, chunksize):
+            chunk.reset_index(drop=True, inplace=True)
+            yield add_delivery_columns(apply_schema(chunk))
+
+
+def store_dir(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), cache_dir, stem + ".store")
+
+
+def partition_name(month):
+    return "month=" + str(month)
+
+
+def store_schema(schema):
+    # pandas picks the narrowest dictionary index per chunk; fix it at int32
+    # so parts written from different chunks concatenate into one column.
+    return pa.schema([
+        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ])
+
+
+def own_dictionaries(table):
+    # A row take keeps the whole chunk's dictionaries; re-encode so each part
+    # file only stores the labels its own rows use.
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            column = table.column(i).cast(field.type.value_type).combine_chunks().dictionary_encode()
+            table = table.set_column(i, field.name, column.cast(field.type))
+    return table
+
+
+def write_partitions(chunk, directory, part):
+    # One Feather file per (chunk, month). Rows without a purchase timestamp
+    # can never match a date filter and are left out of the store.
+    months = chunk['order_purchase_timestamp'].to_numpy().astype('datetime64[M]')
+    # Convert the chunk to Arrow once; each month is then a cheap row take.
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    table = table.cast(store_schema(table.schema))
+    for month in np.unique(months[~np.isnat(months)]):
+        partition = os.path.join(directory, partition_name(month))
+        os.makedirs(partition, exist_ok=True)
+        feather.write_feather(own_dictionaries(table.take(np.flatnonzero(months == month))),
+                              os.path.join(partition, "part-%05d.feather" % part),
+                              compression="uncompressed")
+
+
+def fold_chunks(chunks, directory, meta):
+    # Writes each chunk as new part files under directory, and keeps the row
+    # count, part count and purchase-time bounds in meta.
+    for chunk in chunks:
+        write_partitions(chunk, directory, meta["parts"])
+        meta["parts"] += 1
+        meta["rows"] += len(chunk)
+        timestamps = chunk['order_purchase_timestamp'].dropna()
+        if len(timestamps):
+            bounds = [timestamps.min(), timestamps.max()]
+            if meta["min_timestamp"] is not None:
+                bounds[0] = min(bounds[0], pd.Timestamp(meta["min_timestamp"]))
+                bounds[1] = max(bounds[1], pd.Timestamp(meta["max_timestamp"]))
+            meta["min_timestamp"], meta["max_timestamp"] = [bound.isoformat() for bound in bounds]
+    return meta
+
+
+def write_pickle(path, value):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def month_parts(directory):
+    # Part file names of every month in the store, by month.
+    return {
+        name[len("month="):]: sorted(os.listdir(os.path.join(directory, name)))
+        for name in sorted(os.listdir(directory)) if name.startswith("month=")
+    }
+
+
+def month_bounds(month):
+    first_day = np.datetime64(month, 'M').astype('datetime64[D]')
+    return first_day, (np.datetime64(month, 'M') + 1).astype('datetime64[D]') - 1
+
+
+def iter_months(directory, columns=None, months=None):
+    # One time-sorted frame per month, oldest first, so a whole-store pass
+    # only ever holds a single month's rows.
+    for month in month_parts(directory) if months is None else months:
+        yield read_range(directory, *month_bounds(month), columns)
+
+
+def sync_summaries(directory, pair_ids=None):
+    # Per month, the daily cube and daily totals of its rows, kept on disk
+    # under summary/ next to the part files they were built from. Every
+    # day falls in one month, so each month is summarized on its own and
+    # only months whose part files changed are read again, or, given
+    # pair_ids, months whose cube keeps pairs for other IDs.
+    summary_dir = os.path.join(directory, "summary")
+    os.makedirs(summary_dir, exist_ok=True)
+    parts = month_parts(directory)
+    summaries = []
+    for month, names in parts.items():
+        path = os.path.join(summary_dir, partition_name(month) + ".pickle")
+        summary = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                summary = pickle.load(f)
+        if (summary is None or summary["parts"] != names
+                or pair_ids is not None and cube_pair_ids(summary["cube"]) != pair_ids):
+            df = read_range(directory, *month_bounds(month), SUMMARY_COLUMNS)
+            summary = {
+                "parts": names,
+                "cube": build_daily_cube(df, pair_ids or ()),
+                "daily": daily_totals(df),
+                "ids": id_hashes(df)
+            }
+            write_pickle(path, summary)
+        summaries.append(summary)
+    return summaries
+
+
+def store_pair_ids(summaries):
+    # The ORDER_IDS whose IDs recur across days, within a month or across
+    # months; each month's hashes are distinct, so a repeat is another month.
+    pair_ids = set().union(*(cube_pair_ids(summary["cube"]) for summary in summaries))
+    for id_column in ORDER_IDS:
+        hashes = np.concatenate([summary["ids"][id_column] for summary in summaries])
+        if len(np.unique(hashes)) < len(hashes):
+            pair_ids.add(id_column)
+    return pair_ids
+
+
+def write_store(directory, meta):
+    # Only the per-month summaries are merged; no row is read twice unless
+    # an ID turns out to recur across months, when every month's cube has
+    # to keep its pairs.
+    summaries = sync_summaries(directory)
+    pair_ids = store_pair_ids(summaries) if summaries else set()
+    if any(cube_pair_ids(summary["cube"]) != pair_ids for summary in summaries):
+        summaries = sync_summaries(directory, pair_ids)
+    cube = merge_cubes([summary["cube"] for summary in summaries]) if summaries else None
+    write_pickle(os.path.join(directory, "cube.pickle"), cube)
+    write_pickle(os.path.join(directory, "series.pickle"), merge_daily(summary["daily"] for summary in summaries))
+    write_meta(os.path.join(directory, "meta.json"), meta)
+    return meta, cube
+
+
+def ingest_csv(path, directory=None, chunksize=CHUNK_ROWS):
+    # Streams path into a month-partitioned store next to the Feather cache,
+    # one chunk at a time, then summarizes it one month at a time.
+    directory = store_dir(path) if directory is None else directory
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    # store_id only changes here, not on appends, so a reader holding state
+    # built from an older version can tell whether the part files it read
+    # are still there.
+    meta = dict(source_meta(path), version=STORE_VERSION, store_id=os.urandom(8).hex(), rows=0, parts=0,
+                min_timestamp=None, max_timestamp=None)
+    fold_chunks(iter_chunks(path, chunksize), tmp_directory, meta)
+    result = write_store(tmp_directory, meta)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return result
+
+
+def append_csv(path, directory, meta, chunksize=CHUNK_ROWS):
+    # Parses only the bytes appended since meta was written. The new rows
+    # land in new part files, so months that already exist just gain a part
+    # and only those months are summarized again. Only whole rows are read;
+    # the new meta ends after the last of them.
+    stop = whole_rows_end(path, meta["size"])
+    if stop == meta["size"]:
+        return meta, read_store_cube(directory)
+    chunks = iter_chunks(path, chunksize, offset=meta["size"], columns=meta["columns"], stop=stop)
+    meta = fold_chunks(chunks, directory, dict(meta))
+    return write_store(directory, dict(meta, **source_meta(path, stop)))
+
+
+def read_store_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def read_store_cube(directory):
+    return read_pickle(os.path.join(directory, "cube.pickle"))
+
+
+def read_store_series(directory):
+    # (first day, daily totals) of the whole store, for a TimeSeries.
+    return read_pickle(os.path.join(directory, "series.pickle"))
+
+
+def partition_paths(directory, start_date=None, end_date=None):
+    # Part files of every month that overlaps [start_date, end_date], in
+    # month then chunk order; the other months are never opened.
+    start = None if start_date is None else np.datetime64(start_date, 'M')
+    end = None if end_date is None else np.datetime64(end_date, 'M')
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("month="):
+            continue
+        month = np.datetime64(name[len("month="):], 'M')
+        if (start is not None and month < start) or (end is not None and month > end):
+            continue
+        partition = os.path.join(directory, name)
+        paths.extend(os.path.join(partition, part) for part in sorted(os.listdir(partition)))
+    return paths
+
+
+def sorted_dictionaries(table):
+    # Each part has its own dictionaries. Unify them and sort the labels in
+    # Arrow, so apply_schema finds every categorical already in order.
+    table = table.unify_dictionaries()
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if not pa.types.is_dictionary(field.type) or column.num_chunks == 0:
+            continue
+        dictionary = column.chunk(0).dictionary
+        order = pc.sort_indices(dictionary)
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order.to_numpy()] = np.arange(len(order), dtype=np.int32)
+        rank, labels = pa.array(rank), dictionary.take(order)
+        table = table.set_column(i, field, pa.chunked_array([
+            pa.DictionaryArray.from_arrays(pc.take(rank, chunk.indices), labels) for chunk in column.chunks
+        ], type=field.type))
+    return table
+
+
+def read_range(directory, start_date=None, end_date=None, columns=None):
+    # Rows purchased on start_date through the whole of end_date, sorted by
+    # purchase time like the Feather cache. Only the overlapping partitions
+    # are opened and only the requested columns are mapped from them.
+    if columns is not None and 'order_purchase_timestamp' not in columns:
+        columns = ['order_purchase_timestamp'] + list(columns)
+    paths = partition_paths(directory, start_date, end_date)
+    if not paths:
+        # Nothing overlaps; any part still carries the schema for an empty frame.
+        first = partition_paths(directory)[:1]
+        if not first:
+            return pd.DataFrame(columns=columns)
+        table = feather.read_table(first[0], columns=columns, memory_map=True)
+        return apply_schema(table.slice(0, 0).to_pandas())
+    tables = [feather.read_table(path, columns=columns, memory_map=True) for path in paths]
+    table = sorted_dictionaries(pa.concat_tables(tables))
+
+    timestamps = table.column('order_purchase_timestamp').to_numpy()
+    order = np.argsort(timestamps, kind="stable")
+    start, stop = day_bounds(timestamps[order], start_date, end_date)
+    df = table.take(order[start:stop]).to_pandas(split_blocks=True)
+    return apply_schema(df)
+
+
+def load_store(path="main_data.csv", chunksize=CHUNK_ROWS):
+    # Same freshness rules as data_loader.load_all_df, but for the store.
+    directory = store_dir(path)
+    mtime_ns, size = source_fingerprint(path)
+    meta = read_store_meta(directory)
+    if meta and meta.get("version") == STORE_VERSION:
+        if meta["mtime_ns"] == mtime_ns and meta["size"] == size:
+            return meta, read_store_cube(directory)
+        if meta["size"] == size and meta["sha256"] == file_hash(path):
+            meta = dict(meta, mtime_ns=mtime_ns)
+            write_meta(os.path.join(directory, "meta.json"), meta)
+            return meta, read_store_cube(directory)
+        if appended_since(path, meta):
+            return append_csv(path, directory, meta, chunksize)
+    return ingest_csv(path, directory, chunksize)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a CSV into the month-partitioned store.")
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    meta, _ = ingest_csv(args.path, chunksize=args.chunksize)
+    print(json.dumps(meta, indent=2))
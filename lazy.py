@@ -0,0 +1,42 @@
+import pandas as pd
+
+# Metrics each dashboard tab reads, so only the tab being viewed is computed.
+TAB_METRICS = {
+    "Sales Performance Overview": [
+        "monthly_order", "by_customer_city", "by_customer_state",
+        "mean_estimated_delivery_time", "mean_delivery_time", "late_delivery"
+    ],
+    "Sales Analysis": [
+        "by_product_category", "by_seller_city", "by_seller_state",
+        "by_order_status", "by_review"
+    ],
+    "Payment Preferences": [
+        "by_payment_sequential", "by_payment_type", "by_payment_installment"
+    ]
+}
+
+
+class LazyMetrics:
+    # Deferred metric sets, one node per section. A section is computed the
+    # first time it is read for a given key (data version and date range) and
+    # memoised in memo, which the dashboard keeps in session_state so that
+    # switching back to a tab reuses its results.
+
+    def __init__(self, compute, memo, key, sections=TAB_METRICS):
+        self.compute = compute
+        self.memo = memo
+        self.key = key
+        self.sections = sections
+        for stale in [memo_key for memo_key in memo if memo_key[0] != key]:
+            del memo[stale]
+
+    def __getitem__(self, section):
+        memo_key = (self.key, section)
+        if memo_key not in self.memo:
+            self.memo[memo_key] = self.compute(self.sections[section])
+        # The dashboard reshapes some frames before drawing them, so hand out
+        # copies and keep the memoised results pristine.
+        return {
+            name: value.copy() if isinstance(value, pd.DataFrame) else value
+            for name, value in self.memo[memo_key].items()
+        }
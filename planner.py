@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_METRICS, query_cube
+from delivery import NAT, NS_PER_DAY, delivery_stats, late_count, mean_days
+from distinct import column_codes, count_distinct, nunique_series
+from helpers import create_monthly_order, create_rfm
+
+# Everything dashboard.py shows, in the order it used to compute them.
+DASHBOARD_METRICS = [
+    "by_customer_city", "by_customer_state", "by_payment_sequential", "by_payment_type",
+    "by_payment_installment", "by_review", "by_order_status", "mean_estimated_delivery_time",
+    "mean_delivery_time", "late_delivery", "monthly_order", "rfm", "by_product_category",
+    "by_seller_city", "by_seller_state"
+]
+
+
+class SharedColumns:
+    # Intermediates that several metrics need (integer codes, timestamps as
+    # int64, month numbers), each computed at most once per frame.
+
+    def __init__(self, df):
+        self.df = df
+        self._memo = {}
+
+    def memo(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def codes(self, column):
+        return self.memo(("codes", column), lambda: column_codes(self.df[column]))
+
+    def floats(self, column):
+        return self.memo(("floats", column), lambda: self.df[column].to_numpy(np.float64, na_value=np.nan))
+
+    def nanoseconds(self, column):
+        return self.memo(("ns", column), lambda: self.df[column].to_numpy("datetime64[ns]").view(np.int64))
+
+    def months(self):
+        # Month number of each purchase counted from the first month present.
+        def compute():
+            month = self.df['order_purchase_timestamp'].to_numpy().astype("datetime64[M]")
+            first = month.min()
+            return (month - first).astype(np.int64), first
+        return self.memo("months", compute)
+
+
+def distinct_metric(by, column, descending=True):
+    def metric(shared):
+        key_codes, labels = shared.codes(by)
+        id_codes, id_labels = shared.codes(column)
+        result = nunique_series(key_codes, labels, id_codes, len(id_labels), by, column)
+        if descending:
+            result = result.sort_values(ascending=False)
+        return result.reset_index()
+    return metric
+
+
+def by_product_category(shared):
+    key_codes, labels = shared.codes("product_category_name")
+    id_codes, id_labels = shared.codes("order_id")
+    orders, observed = count_distinct(key_codes, len(labels), id_codes, len(id_labels))
+    keep = key_codes >= 0
+    revenue = np.bincount(key_codes[keep], weights=np.nan_to_num(shared.floats("price")[keep]), minlength=len(labels))
+    return pd.DataFrame({
+        "product_category_name": labels.take(observed),
+        "Total Orders": orders[observed],
+        "Total Revenue": revenue[observed]
+    })
+
+
+def mean_estimated_delivery_time(shared):
+    return mean_days(shared.df, 'estimated_delivery_time')
+
+
+def mean_delivery_time(shared):
+    return mean_days(shared.df, 'delivery_time')
+
+
+def late_delivery(shared):
+    return late_count(shared.df)
+
+
+def monthly_order(shared):
+    if shared.df.empty:
+        return create_monthly_order(shared.df)
+    months, first = shared.months()
+    n_months = int(months.max()) + 1
+    order_codes, order_labels = shared.codes("order_id")
+    orders, _ = count_distinct(months, n_months, order_codes, len(order_labels))
+    revenue = np.bincount(months, weights=np.nan_to_num(shared.floats("price")), minlength=n_months)
+
+    freight = shared.floats("freight_value")
+    known = ~np.isnan(freight)
+    freight_sum = np.bincount(months[known], weights=freight[known], minlength=n_months)
+    freight_count = np.bincount(months[known], minlength=n_months)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        monthly_order = pd.DataFrame({
+            "Months": np.datetime_as_string(np.arange(first, first + n_months)),
+            "Total Orders": orders,
+            "Total Revenue": revenue,
+            "Average Shipping Cost per Order": freight_sum / freight_count
+        })
+        monthly_order["Average Order Value"] = monthly_order["Total Revenue"] / monthly_order["Total Orders"]
+    return monthly_order
+
+
+def rfm(shared):
+    if shared.df.empty:
+        return create_rfm(shared.df)
+    customer_codes, customers = shared.codes("customer_unique_id")
+    order_codes, order_labels = shared.codes("order_id")
+    timestamps = shared.nanoseconds("order_purchase_timestamp")
+    frequency, observed = count_distinct(customer_codes, len(customers), order_codes, len(order_labels))
+
+    keep = customer_codes >= 0
+    last_order = np.full(len(customers), NAT)
+    np.maximum.at(last_order, customer_codes[keep], timestamps[keep])
+    monetary = np.bincount(customer_codes[keep], weights=np.nan_to_num(shared.floats("price")[keep]),
+                           minlength=len(customers))
+
+    return pd.DataFrame({
+        "customer_unique_id": customers.take(observed),
+        "frequency": frequency[observed],
+        "monetary": monetary[observed],
+        "recency": (timestamps.max() - last_order[observed]) // NS_PER_DAY
+    })
+
+
+METRICS = {
+    "by_customer_city": distinct_metric("customer_city", "customer_id"),
+    "by_customer_state": distinct_metric("customer_state", "customer_id"),
+    "by_payment_sequential": distinct_metric("payment_sequential", "order_id"),
+    "by_payment_type": distinct_metric("payment_type", "order_id"),
+    "by_payment_installment": distinct_metric("payment_installments", "order_id"),
+    "by_review": distinct_metric("review_score", "order_id", descending=False),
+    "by_order_status": distinct_metric("order_status", "order_id"),
+    "mean_estimated_delivery_time": mean_estimated_delivery_time,
+    "mean_delivery_time": mean_delivery_time,
+    "late_delivery": late_delivery,
+    "delivery_stats": lambda shared: delivery_stats(shared.df),
+    "monthly_order": monthly_order,
+    "rfm": rfm,
+    "by_product_category": by_product_category,
+    "by_seller_city": distinct_metric("seller_city", "seller_id"),
+    "by_seller_state": distinct_metric("seller_state", "seller_id")
+}
+
+# Columns each metric reads, so a column store only has to map those.
+METRIC_COLUMNS = {
+    "by_customer_city": ["customer_city", "customer_id"],
+    "by_customer_state": ["customer_state", "customer_id"],
+    "by_payment_sequential": ["payment_sequential", "order_id"],
+    "by_payment_type": ["payment_type", "order_id"],
+    "by_payment_installment": ["payment_installments", "order_id"],
+    "by_review": ["review_score", "order_id"],
+    "by_order_status": ["order_status", "order_id"],
+    "mean_estimated_delivery_time": ["estimated_delivery_time"],
+    "mean_delivery_time": ["delivery_time"],
+    "late_delivery": ["is_late"],
+    "delivery_stats": ["delivery_time", "estimated_delivery_time", "is_late"],
+    "monthly_order": ["order_purchase_timestamp", "order_id", "price", "freight_value"],
+    "rfm": ["customer_unique_id", "order_id", "order_purchase_timestamp", "price"],
+    "by_product_category": ["product_category_name", "order_id", "price"],
+    "by_seller_city": ["seller_city", "seller_id"],
+    "by_seller_state": ["seller_state", "seller_id"]
+}
+
+
+def metric_columns(metrics):
+    columns = ["order_purchase_timestamp"]
+    for name in metrics:
+        columns.extend(column for column in METRIC_COLUMNS[name] if column not in columns)
+    return columns
+
+
+def compute_metrics(df, metrics=DASHBOARD_METRICS, cube=None, start_date=None, end_date=None):
+    # With a daily cube, the per-dimension breakdowns come from its day
+    # buckets; everything else shares one SharedColumns over the rows.
+    results = {}
+    if cube is not None:
+        results.update(query_cube(cube, start_date, end_date, [name for name in metrics if name in CUBE_METRICS]))
+    shared = SharedColumns(df)
+    for name in metrics:
+        if name not in results:
+            results[name] = METRICS[name](shared)
+    return results
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import telemetry
+
+# Speculation from every session shares this one thread, so it never takes
+# more than a core away from the reruns users are waiting for.
+_pool = ThreadPoolExecutor(1, thread_name_prefix="prefetch")
+
+
+def month_span(start_date, end_date):
+    # How many whole calendar months the range covers, or 0 if it does not
+    # start on a first and end on a last day of a month.
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if start.day != 1 or not end.is_month_end:
+        return 0
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def adjacent_ranges(start_date, end_date, min_date, max_date):
+    # The ranges a user most often picks next, most likely first: the
+    # following and preceding range of the same length (whole calendar
+    # months stay whole months), then the range widened at either end.
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    months = month_span(start, end)
+    if months:
+        step = pd.DateOffset(months=months)
+        following = (start + step, start + 2 * step - pd.Timedelta(days=1))
+        preceding = (start - step, start - pd.Timedelta(days=1))
+    else:
+        step = end - start + pd.Timedelta(days=1)
+        following = (start + step, end + step)
+        preceding = (start - step, end - step)
+    candidates = [following, preceding, (preceding[0], end), (start, following[1])]
+
+    lowest, highest = pd.Timestamp(min_date).normalize(), pd.Timestamp(max_date).normalize()
+    ranges = []
+    for candidate_start, candidate_end in candidates:
+        candidate = (max(candidate_start, lowest).date(), min(candidate_end, highest).date())
+        if candidate[0] <= candidate[1] and candidate != (start.date(), end.date()) and candidate not in ranges:
+            ranges.append(candidate)
+    return ranges
+
+
+class Prefetcher:
+    # One per session: results for the ranges the user is likely to pick
+    # next, computed in the background while the session is idle and kept
+    # for the last max_ranges ranges. Each idle period may spend at most
+    # cpu_budget seconds of CPU; any new rerun cancels what is left. Both are
+    # checked between metrics, so at most one metric runs past them.
+
+    def __init__(self, max_ranges, cpu_budget):
+        self.max_ranges = max_ranges
+        self.cpu_budget = cpu_budget
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._future = None
+
+    def get(self, range_key, name):
+        with self._lock:
+            values = self._results.get(range_key)
+            if values is None or name not in values:
+                return False, None
+            self._results.move_to_end(range_key)
+            return True, values[name]
+
+    def missing(self, range_key, names):
+        with self._lock:
+            values = self._results.get(range_key, {})
+            return [name for name in names if name not in values]
+
+    def store(self, range_key, values):
+        with self._lock:
+            self._results.setdefault(range_key, {}).update(values)
+            self._results.move_to_end(range_key)
+            while len(self._results) > self.max_ranges:
+                self._results.popitem(last=False)
+
+    def cancel(self):
+        # A metric already running finishes, but nothing after it starts.
+        self._cancelled.set()
+        if self._future is not None:
+            self._future.cancel()
+
+    def start(self, range_keys, names, compute):
+        # compute(range_key, names) is a generator of (name, value) for that
+        # range, computing each metric only when asked for the next one.
+        self.cancel()
+        self._cancelled = cancelled = threading.Event()
+        self._future = _pool.submit(self.run, range_keys, names, compute, cancelled)
+
+    def run(self, range_keys, names, compute, cancelled):
+        spent = 0.0
+        for range_key in range_keys:
+            if cancelled.is_set() or spent >= self.cpu_budget:
+                return
+            missing = self.missing(range_key, names)
+            if not missing:
+                continue
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            values = compute(range_key, missing)
+            try:
+                for name, value in values:
+                    # Results stay valid even if the user moved on meanwhile.
+                    self.store(range_key, {name: value})
+                    if cancelled.is_set() or spent + time.thread_time() - cpu_start >= self.cpu_budget:
+                        break
+            finally:
+                values.close()
+                spent += time.thread_time() - cpu_start
+                telemetry.record("prefetch", "prefetch", time.perf_counter() - start)
@@ -0,0 +1,271 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import charts
+from charts import (frequency_chart, line_chart, monetary_chart, order_status_chart, payment_installment_chart,
+                    payment_sequential_chart, payment_type_chart, recency_chart, render, review_chart,
+                    top_bottom_chart)
+from cube import build_daily_cube
+from data_loader import load_all_df, slice_dates
+from executor import compute_metrics
+from lazy import TAB_METRICS
+from rfm_engine import RFMIndex, RFMWindow, rfm_rows
+from timeseries import GRANULARITIES, TimeSeries, daily_totals
+
+# One chart as the dashboard draws it: draw(*frames, **params).
+Chart = namedtuple("Chart", ["draw", "frames", "params"])
+
+
+def chart(draw, *frames, **params):
+    return Chart(draw, frames, params)
+
+
+def section_charts(section, results, rfm=None, series=None, period="Months"):
+    # Every chart one dashboard tab draws, in order, with the reshaping the tab
+    # does first. results are the tab's metrics; Sales Analysis also needs
+    # the RFM summary, and Sales Performance Overview the time series window.
+    if section == "Sales Performance Overview":
+        by_customer_city = results["by_customer_city"]
+        by_customer_state = results["by_customer_state"]
+        return {
+            "orders": chart(line_chart, series, column='Total Orders', x=period),
+            "revenue": chart(line_chart, series, column='Total Revenue', x=period),
+            "aov": chart(line_chart, series, column='Average Order Value', x=period),
+            "customer_city": chart(
+                top_bottom_chart,
+                by_customer_city.head(5),
+                by_customer_city.sort_values(by="customer_id", ascending=True).head(5),
+                x="customer_id", y="customer_city", xlabel="Total Orders",
+                top_title="Top 5 Cities by Order Volume", bottom_title="Bottom 5 Cities by Order Volume",
+                figsize=(16,8), title_size=30
+            ),
+            "customer_state": chart(
+                top_bottom_chart,
+                by_customer_state.head(5),
+                by_customer_state.sort_values(by="customer_id", ascending=True).head(5),
+                x="customer_id", y="customer_state", xlabel="Total Orders",
+                top_title="Top 5 States by Order Volume", bottom_title="Bottom 5 States by Order Volume",
+                figsize=(16,8), title_size=30
+            ),
+            "shipping": chart(line_chart, series, column='Average Shipping Cost per Order', x=period)
+        }
+
+    if section == "Sales Analysis":
+        by_product_category = results["by_product_category"]
+        by_seller_city = results["by_seller_city"]
+        by_seller_state = results["by_seller_state"]
+        by_review = results["by_review"].astype({"review_score": int})
+        return {
+            "category_orders": chart(
+                top_bottom_chart,
+                by_product_category.sort_values(by="Total Orders", ascending=False).head(5),
+                by_product_category.sort_values(by="Total Orders", ascending=True).head(5),
+                x="Total Orders", y="product_category_name", xlabel="Total Orders",
+                top_title="Top 5 Best-Sellers", bottom_title="Bottom 5 Worst-Sellers",
+                figsize=(10,5), title_size=20
+            ),
+            "category_revenue": chart(
+                top_bottom_chart,
+                by_product_category.sort_values(by="Total Revenue", ascending=False).head(5),
+                by_product_category.sort_values(by="Total Revenue", ascending=True).head(5),
+                x="Total Revenue", y="product_category_name", xlabel="Total Revenue",
+                top_title="Highest Revenue Products", bottom_title="Lowest Revenue Products",
+                figsize=(10,5), title_size=20
+            ),
+            "seller_city": chart(
+                top_bottom_chart,
+                by_seller_city.sort_values(by="seller_id", ascending=False).head(5),
+                by_seller_city.sort_values(by="seller_id", ascending=True).head(5),
+                x="seller_id", y="seller_city", xlabel="Total Sellers",
+                top_title="TOP 5 Seller Cites", bottom_title="BOTTOM 5 Seller Cities",
+                figsize=(12,6), title_size=20
+            ),
+            "seller_state": chart(
+                top_bottom_chart,
+                by_seller_state.sort_values(by="seller_id", ascending=False).head(5),
+                by_seller_state.sort_values(by="seller_id", ascending=True).head(5),
+                x="seller_id", y="seller_state", xlabel="Total Sellers",
+                top_title="TOP 5 Seller States", bottom_title="BOTTOM 5 Seller States",
+                figsize=(12,6), title_size=20
+            ),
+            "order_status": chart(order_status_chart, results["by_order_status"]),
+            "review": chart(review_chart, by_review),
+            "recency": chart(recency_chart, rfm["top_recency"]),
+            "frequency": chart(frequency_chart, rfm["top_frequency"]),
+            "monetary": chart(monetary_chart, rfm["top_monetary"])
+        }
+
+    by_payment_sequential = results["by_payment_sequential"].astype({"payment_sequential": int})
+    by_payment_installment = results["by_payment_installment"].astype({"payment_installments": int})
+    by_payment_installment = by_payment_installment.sort_values(by="order_id", ascending=False)
+    return {
+        "payment_sequential": chart(payment_sequential_chart, by_payment_sequential),
+        "payment_type": chart(payment_type_chart, results["by_payment_type"]),
+        "payment_installment": chart(payment_installment_chart, by_payment_installment)
+    }
+
+
+def section_metrics(section, results, totals=None, rfm=None):
+    # The headline numbers one dashboard tab shows, by their labels.
+    if section == "Sales Performance Overview":
+        monthly_order = results["monthly_order"]
+        return {
+            "Total Orders": int(totals['orders']),
+            "Total Revenue": int(totals['revenue']),
+            "Average Order Value": round(monthly_order['Average Order Value'].mean(), 2),
+            "Customer City": results["by_customer_city"]['customer_city'].nunique(),
+            "Customer State": results["by_customer_state"]['customer_state'].nunique(),
+            "Average Est. Delivery Time": round(results["mean_estimated_delivery_time"], 2),
+            "Average Delivery Time": round(results["mean_delivery_time"], 2),
+            "Late Deliveries": results["late_delivery"],
+            "Average Shipping Cost": round(monthly_order['Average Shipping Cost per Order'].mean(), 2)
+        }
+    if section == "Sales Analysis":
+        return {
+            "Product Category": results["by_product_category"]['product_category_name'].nunique(),
+            "Seller City": results["by_seller_city"]['seller_city'].nunique(),
+            "Seller State": results["by_seller_state"]['seller_state'].nunique(),
+            "Average Recency": round(rfm['average_recency'], 2),
+            "Average Frequency": round(rfm['average_frequency'], 2),
+            "Average Monetary": round(rfm['average_monetary'], 2)
+        }
+    return {}
+
+
+# The loaded dataset, set in the parent before the pool starts. Forked
+# workers inherit it, sharing its pages copy-on-write; spawned ones load
+# their own from the Feather cache.
+_data = None
+
+
+def load_data(path):
+    global _data
+    if _data is None or _data["path"] != path:
+        df = load_all_df(path)
+        _data = {
+            "path": path,
+            "df": df,
+            "cube": build_daily_cube(df),
+            "rfm_index": RFMIndex(rfm_rows(df)),
+            "timeseries": TimeSeries(*daily_totals(df))
+        }
+    return _data
+
+
+def init_worker(path):
+    load_data(path)
+    # Every image is written once, so keeping them would only cost memory.
+    charts.chart_cache = charts.ChartCache(0)
+
+
+def report_range(label, start_date, end_date, output_dir, image_format, granularity):
+    # Renders every dashboard chart for one date range into output_dir/label,
+    # with the frames behind them as CSV, and returns the headline numbers.
+    data = _data
+    filtered = slice_dates(data["df"], start_date, end_date)
+    range_dir = os.path.join(output_dir, label)
+    os.makedirs(range_dir, exist_ok=True)
+    series = data["timeseries"].window(start_date, end_date, granularity)
+    totals = data["timeseries"].totals(start_date, end_date)
+
+    row = {"range": label, "start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    for section, names in TAB_METRICS.items():
+        results = compute_metrics(filtered, names, data["cube"], start_date, end_date, workers=1,
+                                  series=data["timeseries"])
+        rfm = RFMWindow(data["rfm_index"]).summary(start_date, end_date) if section == "Sales Analysis" else None
+        row.update(section_metrics(section, results, totals, rfm))
+        if filtered.empty:
+            continue
+        for name, spec in section_charts(section, results, rfm, series, GRANULARITIES[granularity][1]).items():
+            image = render(spec.draw, *spec.frames, image_format=image_format, **spec.params)
+            with open(os.path.join(range_dir, f"{name}.{image_format}"), "wb") as f:
+                f.write(image)
+        frames = dict(results)
+        if section == "Sales Performance Overview":
+            # The charted series, named by its granularity; at Monthly it is
+            # monthly_order itself and is written once.
+            frames[f"{granularity.lower()}_order"] = series
+        if rfm is not None:
+            frames.update((name, rfm[name]) for name in ["top_recency", "top_frequency", "top_monetary"])
+        for name, frame in frames.items():
+            if isinstance(frame, pd.DataFrame):
+                frame.to_csv(os.path.join(range_dir, f"{name}.csv"), index=False)
+    return row
+
+
+def date_ranges(first_date, last_date, every=None, custom=()):
+    # (label, start, end) for each calendar period of every (clipped to the
+    # data) and each custom (start, end) pair; the whole span by default.
+    # Labels are directory names, so they are built from the two days rather
+    # than str(period), which for weeks contains a slash.
+    ranges = []
+    if every:
+        for period in pd.period_range(first_date, last_date, freq=every):
+            start = max(period.start_time.date(), first_date)
+            end = min(period.end_time.date(), last_date)
+            ranges.append((f"{start}_{end}", start, end))
+    for start, end in custom:
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        ranges.append((f"{start}_{end}", start, end))
+    if not ranges:
+        ranges.append((f"{first_date}_{last_date}", first_date, last_date))
+    return ranges
+
+
+def pool_context():
+    # fork shares the parent's loaded frame with every worker; where fork is
+    # unavailable the workers load it themselves.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the dashboard's charts for many date ranges.")
+    parser.add_argument("path", nargs="?", default="main_data.csv")
+    parser.add_argument("--output-dir", default="reports")
+    parser.add_argument("--every", choices=["W", "M", "Q", "Y"], help="one report per week, month, quarter or year")
+    parser.add_argument("--range", nargs=2, action="append", default=[], metavar=("START", "END"),
+                        help="a custom range, both days included; may be repeated")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--granularity", choices=list(GRANULARITIES), default="Monthly")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = load_data(args.path)
+    timestamps = data["df"]['order_purchase_timestamp']
+    ranges = date_ranges(timestamps.min().date(), timestamps.max().date(), args.every, args.range)
+    # Imported once here, so forked workers do not each import them again.
+    charts.plotting()
+    loaded = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(label, start_date, end_date, args.output_dir, args.format, args.granularity)
+            for label, start_date, end_date in ranges]
+    if args.workers <= 1:
+        init_worker(args.path)
+        rows = [report_range(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(args.workers, mp_context=pool_context(),
+                                 initializer=init_worker, initargs=(args.path,)) as pool:
+            rows = list(pool.map(report_range, *zip(*jobs)))
+
+    pd.DataFrame(rows).to_csv(os.path.join(args.output_dir, "summary.csv"), index=False)
+    print(json.dumps({
+        "ranges": len(ranges),
+        "workers": args.workers,
+        "load_s": round(loaded, 2),
+        "total_s": round(time.perf_counter() - start, 2)
+    }))
+
+
+if __name__ == "__main__":
+    main()
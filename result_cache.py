@@ -0,0 +1,170 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import config
+import warmup
+
+# Part of every key, so results pickled by older code are never reused.
+RESULT_VERSION = 2
+
+
+def size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(size_of(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class Pending:
+    # A result one thread is computing and others are waiting for.
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ok = False
+        self.value = None
+
+    def set(self, ok, value=None):
+        self.ok, self.value = ok, value
+        self.event.set()
+
+
+class ResultCache:
+    # Process-wide results shared by every session, keyed on (dataset
+    # version, start date, end date, metric). Entries are evicted least
+    # recently used first once their estimated size passes max_bytes. A key
+    # that is already being computed is waited for rather than recomputed.
+    # With spill_dir, results are also pickled there, so they survive restarts.
+    # Results computed by the boot warm-up are pinned and never evicted.
+
+    def __init__(self, max_bytes, spill_dir=None, spill_bytes=0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        return self.get_many([key], lambda keys: {keys[0]: compute()})[key]
+
+    def get_many(self, keys, compute):
+        # compute(missing_keys) returns {key: value} for exactly those keys;
+        # it is called at most once, with the keys nobody else is computing.
+        results, claimed, waiting = {}, [], {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[key] = self._entries[key][0]
+                elif key in self._pending:
+                    waiting[key] = self._pending[key]
+                else:
+                    self._pending[key] = Pending()
+                    claimed.append(key)
+
+        missing = []
+        for key in claimed:
+            found, value = self.load(key)
+            if found:
+                self.finish(key, True, value)
+                results[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            try:
+                computed = compute(missing)
+            except BaseException:
+                # Waiters retry on their own; an interrupted rerun in one
+                # session must not fail the others.
+                for key in missing:
+                    self.finish(key, False)
+                raise
+            for key in missing:
+                self.finish(key, True, computed[key])
+                self.spill(key, computed[key])
+                results[key] = computed[key]
+
+        retry = []
+        for key, pending in waiting.items():
+            pending.event.wait()
+            if pending.ok:
+                results[key] = pending.value
+            else:
+                retry.append(key)
+        if retry:
+            results.update(self.get_many(retry, compute))
+        return results
+
+    def finish(self, key, ok, value=None):
+        with self._lock:
+            pending = self._pending.pop(key)
+            if ok:
+                size = size_of(value)
+                if size <= self.max_bytes:
+                    self._entries[key] = (value, size)
+                    self.size += size
+                    if warmup.active.get():
+                        self._pinned.add(key)
+                    while self.size > self.max_bytes:
+                        victim = next((old for old in self._entries if old not in self._pinned), None)
+                        if victim is None:
+                            break
+                        self.size -= self._entries.pop(victim)[1]
+        pending.set(ok, value)
+
+    def spill_path(self, key):
+        digest = hashlib.blake2b(repr((RESULT_VERSION, key)).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.spill_dir, digest + ".pickle")
+
+    def load(self, key):
+        if not self.spill_dir:
+            return False, None
+        try:
+            with open(self.spill_path(key), "rb") as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False, None
+        return stored_key == (RESULT_VERSION, key), value
+
+    def spill(self, key, value):
+        if not self.spill_dir:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self.spill_path(key)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(((RESULT_VERSION, key), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.prune_spill()
+
+    def prune_spill(self):
+        # Oldest files go first once the directory passes its byte budget.
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(".pickle"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.spill_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+results = ResultCache(config.RESULT_CACHE_MB * 2**20, config.RESULT_CACHE_DIR or None,
+                      config.RESULT_CACHE_DISK_MB * 2**20)
@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+from data_loader import day_bounds
+from delivery import NS_PER_DAY
+from distinct import column_codes, merge_labels
+
+
+def mask_ids(labels):
+    # Shortened customer IDs for chart axes, built once per distinct customer.
+    labels = pd.Series(labels, dtype=object)
+    return (labels.str[:3] + ".." + labels.str[-3:]).to_numpy()
+
+
+def top_k(values, k, largest=True):
+    # Positions of the k largest (or smallest) values in O(n), then ordered.
+    k = min(k, len(values))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+    keys = -values if largest else values
+    picked = np.argpartition(keys, k - 1)[:k]
+    return picked[np.argsort(keys[picked], kind="stable")]
+
+
+def rfm_rows(df):
+    # The per-row arrays an RFMIndex is built from, for the time-sorted rows
+    # of df, with customers coded against df's own labels.
+    customer_codes, customers = column_codes(df['customer_unique_id'])
+    price = df['price'].to_numpy(np.float64, na_value=np.nan)
+    order_codes, _ = column_codes(df['order_id'])
+    first_of_order = np.zeros(len(df), dtype=bool)
+    first_of_order[np.unique(order_codes, return_index=True)[1]] = True
+    first_of_order[order_codes < 0] = False
+    return {
+        "customers": customers,
+        "customer_codes": customer_codes,
+        "timestamps": df['order_purchase_timestamp'].to_numpy("datetime64[ns]").view(np.int64),
+        "cents": np.rint(np.nan_to_num(price) * 100).astype(np.int64),
+        "first_of_order": first_of_order
+    }
+
+
+def previous_rows(customer_codes):
+    # Per row, the previous row of the same customer, or -1. Rows without a
+    # customer (-1) are linked to each other like one more customer.
+    by_customer = np.argsort(customer_codes, kind="stable")
+    same = customer_codes[by_customer[1:]] == customer_codes[by_customer[:-1]]
+    previous_row = np.full(len(customer_codes), -1, dtype=np.int64)
+    previous_row[by_customer[1:][same]] = by_customer[:-1][same]
+    return previous_row
+
+
+def concat_rows(parts):
+    # rfm_rows of consecutive, disjoint spans of time, in time order, as the
+    # rows of the whole span. Customers are recoded against the sorted union
+    # of every part's labels, as one frame's categories would be. parts may
+    # be a generator, so only one part's frame is ever loaded at a time;
+    # orders never straddle parts, since an order has one purchase timestamp.
+    parts = list(parts)
+    customers = pd.Index(np.concatenate([np.asarray(part["customers"], dtype=object) for part in parts]))
+    customers = customers.unique().sort_values()
+    codes = []
+    for part in parts:
+        mapping = customers.get_indexer(part["customers"])
+        codes.append(np.where(part["customer_codes"] >= 0, mapping[part["customer_codes"]], -1))
+    rows = {
+        name: np.concatenate([part[name] for part in parts])
+        for name in ["timestamps", "cents", "first_of_order"]
+    }
+    return dict(rows, customers=customers, customer_codes=np.concatenate(codes))
+
+
+def extend_rows(index, rows):
+    # rfm_rows of the time-sorted rows from some day on, put in place of the
+    # index's rows from that day, e.g. after rows were appended to the file.
+    # Rows before that day keep their positions, previous-row links and
+    # shortened IDs, so only the new rows are sorted by customer; each
+    # customer's first new row links to their last row before the cut.
+    start = rows["timestamps"][:1].view("datetime64[ns]")
+    cut = index.bounds(start[0], None)[0] if len(start) else len(index.timestamps)
+    # Only the customers the new rows use are looked up in the index's.
+    codes = rows["customer_codes"]
+    used = np.unique(codes[codes >= 0])
+    customers, old_at, used_at = merge_labels(index.customers, rows["customers"][used])
+    mapping = np.full(len(rows["customers"]), -1, dtype=np.int64)
+    mapping[used] = used_at
+    tail_codes = np.where(codes >= 0, mapping[codes], -1)
+    head_codes = index.customer_codes[:cut]
+    masked_ids = index.masked_ids
+    if customers is not index.customers:
+        head_codes = np.where(head_codes >= 0, old_at[head_codes], -1)
+        added = np.ones(len(customers), dtype=bool)
+        added[old_at] = False
+        masked_ids = np.empty(len(customers), dtype=object)
+        masked_ids[old_at] = index.masked_ids
+        masked_ids[added] = mask_ids(customers[added])
+
+    head_previous = index.previous_row[:cut]
+    # A row no later row links back to is its customer's last; slot 0 of
+    # last_row stands for rows without a customer.
+    is_last = np.ones(cut, dtype=bool)
+    is_last[head_previous[head_previous >= 0]] = False
+    last_row = np.full(len(customers) + 1, -1, dtype=np.int64)
+    last_row[head_codes[is_last] + 1] = np.flatnonzero(is_last)
+
+    tail_previous = previous_rows(tail_codes)
+    first = tail_previous < 0
+    tail_previous[~first] += cut
+    tail_previous[first] = last_row[tail_codes[first] + 1]
+    return dict(rows, customers=customers, masked_ids=masked_ids,
+                customer_codes=np.concatenate([head_codes, tail_codes]),
+                timestamps=np.concatenate([index.timestamps[:cut], rows["timestamps"]]),
+                cents=np.concatenate([index.cents[:cut], rows["cents"]]),
+                first_of_order=np.concatenate([index.first_of_order[:cut], rows["first_of_order"]]),
+                previous_row=np.concatenate([head_previous, tail_previous]))
+
+
+class RFMIndex:
+    # Read-only arrays over the time-sorted order table (see rfm_rows), shared
+    # by every session: customer codes, int64 timestamps, prices in cents,
+    # which row starts each order and, per row, the previous row of the same
+    # customer. extend_rows may hand over the links and shortened IDs ready.
+
+    def __init__(self, rows):
+        self.customers = rows["customers"]
+        self.customer_codes = rows["customer_codes"]
+        self.n_customers = len(self.customers)
+        self.masked_ids = rows.get("masked_ids")
+        if self.masked_ids is None:
+            self.masked_ids = mask_ids(self.customers)
+        self.timestamps = rows["timestamps"]
+        self.cents = rows["cents"]
+        self.first_of_order = rows["first_of_order"]
+        self.previous_row = rows.get("previous_row")
+        if self.previous_row is None:
+            self.previous_row = previous_rows(self.customer_codes)
+
+    def bounds(self, start_date, end_date):
+        return day_bounds(self.timestamps.view("datetime64[ns]"), start_date, end_date)
+
+
+class RFMWindow:
+    # Per-customer RFM state for one session's current row window. Moving the
+    # window only folds in or out the rows that entered or left it. Orders
+    # never straddle a window edge, because all rows of an order share one
+    # purchase timestamp, so frequency can be kept as a count of order starts.
+
+    def __init__(self, index):
+        self.index = index
+        self.start = self.stop = 0
+        self.rows = np.zeros(index.n_customers, dtype=np.int64)
+        self.frequency = np.zeros(index.n_customers, dtype=np.int64)
+        self.monetary = np.zeros(index.n_customers, dtype=np.int64)
+        # Last row of each customer in the window; only read while rows > 0.
+        self.last_row = np.full(index.n_customers, -1, dtype=np.int64)
+
+    def fold(self, start, stop, sign):
+        index = self.index
+        customers = index.customer_codes[start:stop]
+        known = customers >= 0
+        customers = customers[known]
+        n = index.n_customers
+        self.rows += sign * np.bincount(customers, minlength=n)
+        self.frequency += sign * np.bincount(customers[index.first_of_order[start:stop][known]], minlength=n)
+        self.monetary += sign * np.bincount(customers, weights=index.cents[start:stop][known], minlength=n).astype(np.int64)
+        return customers, np.flatnonzero(known) + start
+
+    def set_last_rows(self, customers, rows, only_new=False):
+        # rows are ascending, so the last occurrence of each customer wins.
+        unique, last = np.unique(customers[::-1], return_index=True)
+        last_rows = rows[::-1][last]
+        if only_new:
+            new = self.rows[unique] == 0
+            unique, last_rows = unique[new], last_rows[new]
+        self.last_row[unique] = last_rows
+
+    def move_to(self, start, stop):
+        moved = abs(start - self.start) + abs(stop - self.stop)
+        if start >= self.stop or stop <= self.start or moved > stop - start:
+            self.rows[:] = self.frequency[:] = self.monetary[:] = 0
+            self.start = self.stop = start
+        if start < self.start:
+            customers, rows = self.customers_in(start, self.start)
+            self.set_last_rows(customers, rows, only_new=True)
+            self.fold(start, self.start, 1)
+        elif start > self.start:
+            self.fold(self.start, start, -1)
+        self.start = start
+        if stop > self.stop:
+            customers, rows = self.fold(self.stop, stop, 1)
+            self.set_last_rows(customers, rows)
+        elif stop < self.stop:
+            customers, rows = self.fold(stop, self.stop, -1)
+            # The first removed row of a customer points back at their last
+            # row that is still before the new stop.
+            unique, first = np.unique(customers, return_index=True)
+            self.last_row[unique] = self.index.previous_row[rows[first]]
+        self.stop = stop
+
+    def customers_in(self, start, stop):
+        customers = self.index.customer_codes[start:stop]
+        known = np.flatnonzero(customers >= 0)
+        return customers[known], known + start
+
+    def summary(self, start_date, end_date, k=10):
+        self.move_to(*map(int, self.index.bounds(start_date, end_date)))
+        present = np.flatnonzero(self.rows)
+        frequency = self.frequency[present]
+        monetary = self.monetary[present] / 100
+        recency = np.array([], dtype=np.int64)
+        if len(present):
+            recent = self.index.timestamps[self.stop - 1]
+            recency = (recent - self.index.timestamps[self.last_row[present]]) // NS_PER_DAY
+
+        def top(values, column, largest):
+            picked = top_k(values, k, largest)
+            return pd.DataFrame({
+                "customer_unique_id": self.index.masked_ids[present[picked]],
+                column: values[picked]
+            })
+
+        return {
+            "average_recency": recency.mean() if len(present) else np.nan,
+            "average_frequency": frequency.mean() if len(present) else np.nan,
+            "average_monetary": monetary.mean() if len(present) else np.nan,
+            "top_recency": top(recency, "recency", largest=False),
+            "top_frequency": top(frequency, "frequency", largest=True),
+            "top_monetary": top(monetary.astype(int), "monetary", largest=True)
+        }
@@ -0,0 +1,81 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from distinct import merge_labels
+
+DATETIME_COLUMNS = ['order_purchase_timestamp', 'order_delivered_customer_date', 'order_estimated_delivery_date']
+
+# Low-cardinality labels the dashboard groups by.
+CATEGORY_COLUMNS = ['customer_city', 'customer_state', 'seller_city', 'seller_state',
+                    'payment_type', 'order_status', 'product_category_name']
+
+# 32-character hashes repeated across item/payment rows. As categoricals each
+# row holds an int32 code and every distinct hash is stored once.
+ID_COLUMNS = ['customer_id', 'order_id', 'seller_id', 'customer_unique_id']
+
+# Small counts that the merge leaves as float64 because of missing values.
+SMALL_INT_COLUMNS = {
+    'payment_sequential': 'UInt8',
+    'payment_installments': 'UInt8',
+    'review_score': 'UInt8'
+}
+
+
+def read_dtypes():
+    dtypes = {column: "category" for column in CATEGORY_COLUMNS + ID_COLUMNS}
+    dtypes.update({column: "float32" for column in SMALL_INT_COLUMNS})
+    return dtypes
+
+
+def apply_schema(df):
+    for column in CATEGORY_COLUMNS + ID_COLUMNS:
+        if column not in df:
+            continue
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+        # read_csv unions the categories of its internal chunks in first-seen
+        # order; sort them so groupbys come out in the same order as on strings.
+        if not df[column].cat.categories.is_monotonic_increasing:
+            df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+    for column, dtype in SMALL_INT_COLUMNS.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    for column in DATETIME_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def concat_categorical(first, second):
+    # The two categoricals as one over the sorted union of their categories.
+    # Concatenating the Series instead would hash every category of both
+    # sides to compare their dtypes; here only the second side's categories,
+    # few for appended rows, are looked up in the first's.
+    categories, first_at, second_at = merge_labels(first.cat.categories, second.cat.categories)
+    codes = []
+    for series, at in [(first, first_at), (second, second_at)]:
+        series_codes = series.cat.codes.to_numpy()
+        if categories is not series.cat.categories:
+            series_codes = np.where(series_codes >= 0, at[series_codes], -1)
+        codes.append(series_codes)
+    dtype = first.dtype if categories is first.cat.categories else pd.CategoricalDtype(categories)
+    return pd.Categorical.from_codes(np.concatenate(codes), dtype=dtype)
+
+
+def memory_report(before, after):
+    report = pd.DataFrame({
+        "before": before.memory_usage(index=False, deep=True),
+        "after": after.memory_usage(index=False, deep=True)
+    })
+    report.loc["total"] = report.sum()
+    report["ratio"] = (report["before"] / report["after"]).round(2)
+    return report
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "main_data.csv"
+    before = pd.read_csv(path)
+    after = apply_schema(pd.read_csv(path, dtype=read_dtypes()))
+    print(memory_report(before, after).to_string())
@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import config
+import telemetry
+from data_loader import read_meta, write_meta
+from ingest import load_store, partition_paths, store_dir
+from planner import METRIC_COLUMNS
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Bump whenever the Parquet files are laid out differently.
+PARQUET_VERSION = 2
+# Rows per Parquet row group. Parts are sorted by purchase time before they
+# are written, so each group covers a short span and its min/max statistics
+# let a date predicate skip whole groups.
+ROW_GROUP_ROWS = 65536
+
+_connections = {}
+_connection_lock = threading.Lock()
+
+
+def parquet_dir(path):
+    return os.path.splitext(store_dir(path))[0] + ".parquet"
+
+
+def sync_parquet(path="main_data.csv"):
+    # Mirrors the month-partitioned store (see ingest.py) as Parquet, one file
+    # per store part. Only parts that are new or changed since the last sync
+    # are converted, so appended rows cost one small file each.
+    meta, _ = load_store(path)
+    source, directory = store_dir(path), parquet_dir(path)
+    parquet_meta = read_meta(os.path.join(directory, "meta.json")) or {}
+    if parquet_meta.get("version") != PARQUET_VERSION:
+        parquet_meta = {"version": PARQUET_VERSION, "parts": {}}
+    os.makedirs(directory, exist_ok=True)
+
+    parts = {}
+    for part_path in partition_paths(source):
+        name = os.path.relpath(part_path, source)
+        stat = os.stat(part_path)
+        parts[name] = [stat.st_size, stat.st_mtime_ns]
+        if parquet_meta["parts"].get(name) == parts[name]:
+            continue
+        table = feather.read_table(part_path)
+        table = table.take(np.argsort(table['order_purchase_timestamp'].to_numpy(), kind="stable"))
+        # Store parts carry their whole chunk's dictionaries; as plain strings
+        # the Parquet writer builds each file's own, holding only its labels.
+        table = table.cast(pa.schema([
+            field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ]))
+        target = os.path.join(directory, os.path.splitext(name)[0] + ".parquet")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        pq.write_table(table, target + ".tmp", row_group_size=ROW_GROUP_ROWS)
+        os.replace(target + ".tmp", target)
+
+    for name in set(parquet_meta["parts"]) - set(parts):
+        try:
+            os.remove(os.path.join(directory, os.path.splitext(name)[0] + ".parquet"))
+        except OSError:
+            pass
+    write_meta(os.path.join(directory, "meta.json"), {"version": PARQUET_VERSION, "parts": parts})
+    return meta, directory
+
+
+def connection(threads=None):
+    # One in-memory DuckDB database per thread count for the process; each
+    # query runs on its own cursor, which is safe to use from any session
+    # thread. threads is a database-wide setting, so speculation gets its
+    # own one-thread database: its queries then run only on the calling
+    # thread, where time.thread_time sees all of their work.
+    if duckdb is None:
+        raise RuntimeError("DASHBOARD_SOURCE=sql needs the duckdb package")
+    threads = config.SQL_THREADS if threads is None else threads
+    with _connection_lock:
+        if threads not in _connections:
+            database = duckdb.connect()
+            if threads:
+                database.execute(f"SET threads = {threads}")
+            _connections[threads] = database
+        return _connections[threads].cursor()
+
+
+def window(directory, columns, start_date=None, end_date=None):
+    # columns of the rows purchased from start_date through the whole of
+    # end_date, as a CTE named w. Only those columns are read; the month
+    # predicate prunes partitions by directory name and the timestamp
+    # predicate row groups by their statistics. The path is bound like every
+    # other value, so no quote in it can end the string.
+    predicates, params = [], [os.path.join(directory, "month=*", "*.parquet")]
+    if start_date is not None:
+        predicates.append("month >= ? AND order_purchase_timestamp >= ?")
+        params += [str(np.datetime64(start_date, "M")), pd.Timestamp(start_date).to_pydatetime()]
+    if end_date is not None:
+        predicates.append("month <= ? AND order_purchase_timestamp < ?")
+        params += [str(np.datetime64(end_date, "M")),
+                   (pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_pydatetime()]
+    source = "read_parquet(?, hive_partitioning = true, hive_types = {'month': VARCHAR})"
+    where = " WHERE " + " AND ".join(predicates) if predicates else ""
+    return f"WITH w AS (SELECT {', '.join(columns)} FROM {source}{where}) ", params
+
+
+def query(cursor, sql, params):
+    return cursor.execute(sql, params).df()
+
+
+def distinct_metric(by, column, descending=True):
+    # Ties are broken by label, where the pandas path leaves them unordered.
+    order = "2 DESC, 1" if descending else "1"
+
+    def metric(cursor, window_sql, params):
+        return query(cursor, window_sql + f"""
+            SELECT {by}, COUNT(DISTINCT {column}) AS {column}
+            FROM w WHERE {by} IS NOT NULL GROUP BY {by} ORDER BY {order}
+        """, params)
+    return metric
+
+
+def by_product_category(cursor, window_sql, params):
+    return query(cursor, window_sql + """
+        SELECT product_category_name,
+               COUNT(DISTINCT order_id) AS "Total Orders",
+               COALESCE(SUM(price), 0) AS "Total Revenue"
+        FROM w WHERE product_category_name IS NOT NULL
+        GROUP BY product_category_name ORDER BY product_category_name
+    """, params)
+
+
+def scalar(cursor, sql, params):
+    value = cursor.execute(sql, params).fetchone()[0]
+    return np.nan if value is None else value
+
+
+def mean_estimated_delivery_time(cursor, window_sql, params):
+    return scalar(cursor, window_sql + "SELECT AVG(estimated_delivery_time) FROM w", params)
+
+
+def mean_delivery_time(cursor, window_sql, params):
+    return scalar(cursor, window_sql + "SELECT AVG(delivery_time) FROM w", params)
+
+
+def late_delivery(cursor, window_sql, params):
+    return int(scalar(cursor, window_sql + "SELECT COALESCE(SUM(is_late::INTEGER), 0) FROM w", params))
+
+
+def delivery_stats(cursor, window_sql, params, percentiles=(50, 90, 95)):
+    row = cursor.execute(window_sql + """
+        SELECT AVG(delivery_time), AVG(estimated_delivery_time),
+               QUANTILE_CONT(delivery_time, ?), COALESCE(SUM(is_late::INTEGER), 0), COUNT(delivery_time)
+        FROM w
+    """, params + [[p / 100 for p in percentiles]]).fetchone()
+    mean_delivery, mean_estimated, values, late, delivered = row
+    return {
+        "mean_delivery_time": np.nan if mean_delivery is None else mean_delivery,
+        "mean_estimated_delivery_time": np.nan if mean_estimated is None else mean_estimated,
+        "delivery_percentiles": pd.Series(values or [np.nan] * len(percentiles), index=list(percentiles),
+                                          name="delivery_time", dtype=np.float64),
+        "late_delivery": int(late),
+        "late_rate": late / delivered if delivered else np.nan
+    }
+
+
+def monthly_order(cursor, window_sql, params):
+    monthly = query(cursor, window_sql + """
+        SELECT strftime(month, '%Y-%m') AS "Months", "Total Orders", "Total Revenue",
+               "Average Shipping Cost per Order"
+        FROM (
+            SELECT date_trunc('month', order_purchase_timestamp) AS month,
+                   COUNT(DISTINCT order_id) AS "Total Orders",
+                   COALESCE(SUM(price), 0) AS "Total Revenue",
+                   AVG(freight_value) AS "Average Shipping Cost per Order"
+            FROM w GROUP BY 1
+        ) ORDER BY month
+    """, params)
+    # Months without orders still get a row, as resample gives them one.
+    if len(monthly):
+        first, last = np.datetime64(monthly["Months"].iloc[0], "M"), np.datetime64(monthly["Months"].iloc[-1], "M")
+        months = pd.Index(np.datetime_as_string(np.arange(first, last + 1)), name="Months")
+        monthly = monthly.set_index("Months").reindex(months).reset_index()
+        monthly[["Total Orders", "Total Revenue"]] = monthly[["Total Orders", "Total Revenue"]].fillna(0)
+    monthly["Total Orders"] = monthly["Total Orders"].astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        monthly["Average Order Value"] = monthly["Total Revenue"] / monthly["Total Orders"]
+    return monthly
+
+
+def rfm(cursor, window_sql, params):
+    # Recency counts whole days back from the window's last purchase.
+    return query(cursor, window_sql + """
+        SELECT customer_unique_id,
+               COUNT(DISTINCT order_id) AS frequency,
+               COALESCE(SUM(price), 0) AS monetary,
+               (epoch_ns((SELECT MAX(order_purchase_timestamp) FROM w))
+                - epoch_ns(MAX(order_purchase_timestamp))) // 86400000000000 AS recency
+        FROM w WHERE customer_unique_id IS NOT NULL
+        GROUP BY customer_unique_id ORDER BY customer_unique_id
+    """, params)
+
+
+# The planner's metrics, as queries over the Parquet mirror.
+METRICS = {
+    "by_customer_city": distinct_metric("customer_city", "customer_id"),
+    "by_customer_state": distinct_metric("customer_state", "customer_id"),
+    "by_payment_sequential": distinct_metric("payment_sequential", "order_id"),
+    "by_payment_type": distinct_metric("payment_type", "order_id"),
+    "by_payment_installment": distinct_metric("payment_installments", "order_id"),
+    "by_review": distinct_metric("review_score", "order_id", descending=False),
+    "by_order_status": distinct_metric("order_status", "order_id"),
+    "mean_estimated_delivery_time": mean_estimated_delivery_time,
+    "mean_delivery_time": mean_delivery_time,
+    "late_delivery": late_delivery,
+    "delivery_stats": delivery_stats,
+    "monthly_order": monthly_order,
+    "rfm": rfm,
+    "by_product_category": by_product_category,
+    "by_seller_city": distinct_metric("seller_city", "seller_id"),
+    "by_seller_state": distinct_metric("seller_state", "seller_id")
+}
+
+
+def iter_metrics(directory, metrics, start_date=None, end_date=None, threads=None):
+    # One query per metric, each yielded as (name, value) when it finishes.
+    cursor = connection(threads)
+    try:
+        for name in metrics:
+            start = time.perf_counter()
+            window_sql, params = window(directory, METRIC_COLUMNS[name], start_date, end_date)
+            value = METRICS[name](cursor, window_sql, params)
+            telemetry.record("metric:" + name, "metric", time.perf_counter() - start)
+            yield name, value
+    finally:
+        cursor.close()
+
+
+def compute_metrics(directory, metrics, start_date=None, end_date=None, threads=None):
+    # Every query runs on DuckDB's own thread pool, or on threads threads.
+    return dict(iter_metrics(directory, metrics, start_date, end_date, threads))
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+# The Profile of the rerun running on this thread, if any.
+_current = ContextVar("profile", default=None)
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def current_rss():
+    # Resident bytes from /proc/self/statm, or None where there is no /proc.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Profile:
+    # Every stage one rerun went through, in the order they finished.
+
+    def __init__(self):
+        self.stages = []
+
+    def frame(self):
+        columns = ["stage", "kind", "ms", "rss_delta_mb"]
+        if not self.stages:
+            return pd.DataFrame(columns=columns)
+        df = pd.DataFrame(self.stages)
+        df["ms"] = df["seconds"] * 1000
+        df["rss_delta_mb"] = df["rss_delta"].astype(float) / 2**20
+        return df[columns]
+
+
+class Registry:
+    # Process-wide, so percentiles cover every session: a rolling window of
+    # recent durations per stage plus all-time counts and sums.
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, kind, seconds):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [kind, 0, 0.0]
+            self._samples[stage].append(seconds)
+            self._totals[stage][1] += 1
+            self._totals[stage][2] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: (list(samples), list(self._totals[stage])) for stage, samples in self._samples.items()}
+
+    def percentiles(self):
+        rows = []
+        for stage, (samples, (kind, count, total)) in sorted(self.snapshot().items()):
+            values = np.percentile(samples, PERCENTILES) * 1000
+            rows.append([stage, kind, count] + list(values))
+        return pd.DataFrame(rows, columns=["stage", "kind", "count"] + [f"p{p}_ms" for p in PERCENTILES])
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP dashboard_stage_seconds Time spent in each dashboard stage.",
+            "# TYPE dashboard_stage_seconds summary"
+        ]
+        for stage, (samples, (kind, count, total)) in sorted(self.snapshot().items()):
+            labels = 'stage="%s",kind="%s"' % (stage.replace("\\", "\\\\").replace('"', '\\"'), kind)
+            for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+                lines.append("dashboard_stage_seconds{%s,quantile=\"%s\"} %.6f" % (labels, p / 100, value))
+            lines.append("dashboard_stage_seconds_sum{%s} %.6f" % (labels, total))
+            lines.append("dashboard_stage_seconds_count{%s} %d" % (labels, count))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(config.TELEMETRY_WINDOW)
+
+
+def enabled():
+    return bool(config.TELEMETRY or config.PROMETHEUS_FILE) or _current.get() is not None
+
+
+def start_profile():
+    # Collects the stages measured from here on, on this thread, into a new
+    # Profile; each Streamlit session reruns its script on its own thread.
+    profile = Profile()
+    _current.set(profile)
+    return profile
+
+
+def record(stage, kind, seconds, rss_delta=None):
+    if not enabled():
+        return
+    entry = {"stage": stage, "kind": kind, "seconds": seconds, "rss_delta": rss_delta}
+    profile = _current.get()
+    if profile is not None:
+        profile.stages.append(entry)
+    registry.add(stage, kind, seconds)
+    logger.info(json.dumps(entry))
+
+
+@contextmanager
+def measure(stage, kind="stage"):
+    # Wall time and resident-memory change of the block. Costs nothing when
+    # telemetry is off and no profile is being collected.
+    if not enabled():
+        yield
+        return
+    rss = current_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        after = current_rss()
+        record(stage, kind, seconds, None if rss is None or after is None else after - rss)
+
+
+def write_prometheus(path=None):
+    # Text-format exposition for node_exporter's textfile collector; written
+    # to a temporary file first so scrapes never see half a file.
+    path = path or config.PROMETHEUS_FILE
+    if not path:
+        return
+    tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+    with open(tmp_path, "w") as f:
+        f.write(registry.prometheus_text())
+    os.replace(tmp_path, path)
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from distinct import column_codes
+
+# UI label -> (pandas period frequency, name of the period column).
+GRANULARITIES = {
+    "Daily": ("D", "Days"),
+    "Weekly": ("W", "Weeks"),
+    "Monthly": ("M", "Months"),
+    "Quarterly": ("Q", "Quarters")
+}
+
+SERIES = ["orders", "revenue", "freight_sum", "freight_count"]
+
+# Dashboard results a TimeSeries answers without reading any rows.
+SERIES_METRICS = ["monthly_order"]
+
+
+def period_labels(periods, freq):
+    if freq == "Q":
+        return periods.astype(str).to_numpy(object)
+    # Weeks are labelled by the Monday they start on.
+    return periods.start_time.strftime("%Y-%m" if freq == "M" else "%Y-%m-%d").to_numpy(object)
+
+
+def daily_totals(df):
+    # First purchase day of df and, per calendar day from it, the rows,
+    # distinct orders, revenue and known freight values. An order is counted
+    # on the day of its first row; all rows of an order share one purchase
+    # timestamp, so whole days of rows can be totalled on their own.
+    timestamps = df['order_purchase_timestamp'].to_numpy("datetime64[ns]")
+    dated = ~np.isnat(timestamps)
+    days = timestamps[dated].astype("datetime64[D]")
+    first_day = days.min() if len(days) else np.datetime64("1970-01-01", "D")
+    day = (days - first_day).astype(np.int64)
+    n_days = int(day.max()) + 1 if len(day) else 0
+
+    order_codes, _ = column_codes(df['order_id'])
+    order_codes = order_codes[dated]
+    first_of_order = np.zeros(len(day), dtype=bool)
+    first_of_order[np.unique(order_codes, return_index=True)[1]] = True
+    first_of_order[order_codes < 0] = False
+
+    price = np.nan_to_num(df['price'].to_numpy(np.float64, na_value=np.nan)[dated])
+    freight = df['freight_value'].to_numpy(np.float64, na_value=np.nan)[dated]
+    known = ~np.isnan(freight)
+
+    return first_day, {
+        "rows": np.bincount(day, minlength=n_days),
+        "orders": np.bincount(day[first_of_order], minlength=n_days),
+        "revenue": np.bincount(day, weights=price, minlength=n_days),
+        "freight_sum": np.bincount(day[known], weights=freight[known], minlength=n_days),
+        "freight_count": np.bincount(day[known], minlength=n_days)
+    }
+
+
+def merge_daily(parts):
+    # daily_totals of disjoint sets of days, such as the store's months, as
+    # one (first day, arrays) pair covering all of them.
+    parts = [(first_day, daily) for first_day, daily in parts if len(daily["rows"])]
+    if not parts:
+        return np.datetime64("1970-01-01", "D"), {name: np.zeros(0) for name in ["rows"] + SERIES}
+    first_day = min(first for first, _ in parts)
+    offsets = [int((first - first_day).astype(np.int64)) for first, _ in parts]
+    n_days = max(offset + len(daily["rows"]) for offset, (_, daily) in zip(offsets, parts))
+    merged = {name: np.zeros(n_days, dtype=values.dtype) for name, values in parts[0][1].items()}
+    for offset, (_, daily) in zip(offsets, parts):
+        for name, values in daily.items():
+            merged[name][offset:offset + len(values)] += values
+    return first_day, merged
+
+
+def extend_series(series, first_day, daily):
+    # series with every day from first_day on replaced by daily, the
+    # daily_totals of the rows from that day, e.g. after rows were appended
+    # to the file. Earlier days keep their totals as they are.
+    stop = int(np.clip((first_day - series.first_day).astype(np.int64), 0, series.n_days))
+    head = {name: values[:stop] for name, values in series.daily.items()}
+    return TimeSeries(*merge_daily([(series.first_day, head), (first_day, daily)]))
+
+
+class TimeSeries:
+    # Running totals per calendar day of distinct orders, revenue and known
+    # freight values (see daily_totals), built once per dataset. Any window,
+    # and any split of it into days, weeks, months or quarters, is a
+    # difference of two entries, so no query touches the rows again.
+
+    def __init__(self, first_day, daily):
+        self.first_day = first_day
+        self.daily = daily
+        self.n_days = len(daily["rows"])
+        # cumulative[name][k] is the total over the days before day k.
+        self.cumulative = {
+            name: np.concatenate([[0], np.cumsum(values)]) for name, values in daily.items()
+        }
+        self._periods = {}
+
+    def day_range(self, start_date=None, end_date=None):
+        # Day offsets [start, stop) of the window, trimmed to days with rows
+        # so a series starts and ends where the filtered data would.
+        start = 0 if start_date is None else (np.datetime64(start_date, "D") - self.first_day).astype(np.int64)
+        stop = self.n_days if end_date is None else (np.datetime64(end_date, "D") - self.first_day).astype(np.int64) + 1
+        start, stop = int(np.clip(start, 0, self.n_days)), int(np.clip(stop, 0, self.n_days))
+        rows = self.cumulative["rows"]
+        if stop <= start or rows[stop] == rows[start]:
+            return 0, 0
+        start = int(np.searchsorted(rows, rows[start], side="right")) - 1
+        stop = int(np.searchsorted(rows, rows[stop], side="left"))
+        return start, stop
+
+    def periods(self, freq):
+        # Period number of every day and the label of each period.
+        if freq not in self._periods:
+            days = pd.period_range(pd.Timestamp(self.first_day), periods=self.n_days, freq="D")
+            periods = days.asfreq(freq)
+            codes, uniques = pd.factorize(periods, sort=True)
+            self._periods[freq] = (codes, period_labels(uniques, freq))
+        return self._periods[freq]
+
+    def totals(self, start_date=None, end_date=None):
+        start, stop = self.day_range(start_date, end_date)
+        return {name: self.cumulative[name][stop] - self.cumulative[name][start] for name in SERIES}
+
+    def window(self, start_date=None, end_date=None, granularity="Monthly"):
+        # The frame create_monthly_order builds, at any granularity; periods
+        # cut by the window only count their days inside it.
+        freq, column = GRANULARITIES[granularity]
+        start, stop = self.day_range(start_date, end_date)
+        codes, labels = self.periods(freq)
+        edges = start + np.flatnonzero(np.diff(codes[start:stop])) + 1
+        starts = np.concatenate([[start], edges]).astype(np.int64) if stop > start else np.array([], dtype=np.int64)
+        stops = np.concatenate([edges, [stop]]).astype(np.int64) if stop > start else np.array([], dtype=np.int64)
+        sums = {name: self.cumulative[name][stops] - self.cumulative[name][starts] for name in SERIES}
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            series = pd.DataFrame({
+                column: labels[codes[starts]] if len(starts) else np.array([], dtype=object),
+                "Total Orders": sums["orders"].astype(np.int64),
+                "Total Revenue": sums["revenue"].astype(np.float64),
+                "Average Shipping Cost per Order": sums["freight_sum"] / sums["freight_count"]
+            })
+            series["Average Order Value"] = series["Total Revenue"] / series["Total Orders"]
+        return series
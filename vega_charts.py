@@ -0,0 +1,150 @@
+import pandas as pd
+
+from charts import colors_1, colors_2, colors_3, colors_4, colors_5, colors_6
+
+# Vega-Lite counterparts of the charts.py figures. Each builder takes the
+# same arguments as its matplotlib twin and returns (data, spec) for
+# st.vega_lite_chart: the browser draws the few aggregated rows, and the
+# server neither lays out nor rasterizes anything.
+
+HIGHLIGHT = "#72BCD4"
+# Roughly matplotlib's inch at the dashboard's column width.
+PIXELS_PER_INCH = 40
+
+
+def with_colors(data, palette):
+    # Bar i gets palette[i], like seaborn's palette argument.
+    data = data.reset_index(drop=True)
+    data["color"] = [palette[i % len(palette)] for i in range(len(data))]
+    return data
+
+
+def labels_as_text(data, *columns):
+    data = data.copy()
+    for column in columns:
+        data[column] = data[column].astype(str)
+    return data
+
+
+def bars(x, y, horizontal, labels=True, reverse=False, axis_right=False, title=None, height=None):
+    category, value = (y, x) if horizontal else (x, y)
+    value_encoding = {"field": value, "type": "quantitative", "title": None}
+    if reverse:
+        value_encoding["scale"] = {"reverse": True}
+    category_encoding = {"field": category, "type": "nominal", "sort": None, "title": None}
+    if axis_right:
+        category_encoding["axis"] = {"orient": "right"}
+    encoding = {
+        ("y" if horizontal else "x"): category_encoding,
+        ("x" if horizontal else "y"): value_encoding
+    }
+    layers = [{
+        "mark": {"type": "bar"},
+        "encoding": dict(encoding, color={"field": "color", "type": "nominal", "scale": None, "legend": None})
+    }]
+    if labels:
+        if horizontal:
+            mark = {"type": "text", "align": "right" if reverse else "left", "dx": -3 if reverse else 3}
+        else:
+            mark = {"type": "text", "baseline": "bottom", "dy": -2}
+        layers.append({
+            "mark": mark,
+            "encoding": dict(encoding, text={"field": value, "type": "quantitative", "format": ",.0f"})
+        })
+    spec = {"layer": layers}
+    if title:
+        spec["title"] = title
+    if height:
+        spec["height"] = height
+    return spec
+
+
+def line_chart(data, column, x='Months'):
+    data = data[[x, column]]
+    return data, {
+        "mark": {"type": "line", "point": True, "color": HIGHLIGHT, "strokeWidth": 3},
+        "encoding": {
+            "x": {"field": x, "type": "ordinal", "title": None},
+            "y": {"field": column, "type": "quantitative", "title": None}
+        }
+    }
+
+
+def top_bottom_chart(top, bottom, x, y, xlabel, top_title, bottom_title, figsize, title_size):
+    top = labels_as_text(with_colors(top[[x, y]], colors_1), y)
+    bottom = labels_as_text(with_colors(bottom[[x, y]], colors_1), y)
+    data = pd.concat([top.assign(panel="top"), bottom.assign(panel="bottom")], ignore_index=True)
+    height = figsize[1] * PIXELS_PER_INCH
+    panels = []
+    for panel, title, reverse in [("top", top_title, False), ("bottom", bottom_title, True)]:
+        spec = bars(x, y, horizontal=True, reverse=reverse, axis_right=reverse,
+                    title={"text": title, "fontSize": title_size}, height=height)
+        spec["transform"] = [{"filter": {"field": "panel", "equal": panel}}]
+        spec["layer"][0]["encoding"]["x"]["title"] = xlabel
+        panels.append(spec)
+    return data, {"hconcat": panels, "resolve": {"scale": {"y": "independent"}}}
+
+
+def order_status_chart(by_order_status):
+    data = with_colors(by_order_status.sort_values(by="order_id", ascending=False), colors_5)
+    data = labels_as_text(data, "order_status")
+    spec = bars("order_id", "order_status", horizontal=True)
+    spec["layer"][0]["encoding"]["x"]["title"] = "Total Orders"
+    return data, spec
+
+
+def review_chart(by_review):
+    data = labels_as_text(with_colors(by_review, colors_4), "review_score")
+    spec = bars("review_score", "order_id", horizontal=False)
+    spec["layer"][0]["encoding"]["y"]["title"] = "Total Orders"
+    return data, spec
+
+
+def customer_chart(data, column, title, labels):
+    data = with_colors(data, colors_6)
+    spec = bars("customer_unique_id", column, horizontal=False, labels=labels, title=title)
+    spec["layer"][0]["encoding"]["x"]["title"] = "Customer Unique ID"
+    return data, spec
+
+
+def recency_chart(top_recency):
+    return customer_chart(top_recency, "recency", "Customer by Recency (days)", labels=False)
+
+
+def frequency_chart(top_frequency):
+    return customer_chart(top_frequency, "frequency", "Customer by Frequency", labels=True)
+
+
+def monetary_chart(top_monetary):
+    return customer_chart(top_monetary, "monetary", "Customer by Monetary", labels=True)
+
+
+def payment_sequential_chart(by_payment_sequential):
+    data = labels_as_text(with_colors(by_payment_sequential, colors_2), "payment_sequential")
+    spec = bars("payment_sequential", "order_id", horizontal=False)
+    spec["layer"][0]["encoding"]["y"]["title"] = "Total Orders"
+    return data, spec
+
+
+def payment_type_chart(by_payment_type):
+    data = labels_as_text(by_payment_type, "payment_type")
+    data["share"] = data["order_id"] / data["order_id"].sum()
+    return data, {
+        "encoding": {
+            "theta": {"field": "order_id", "type": "quantitative", "stack": True},
+            "color": {"field": "payment_type", "type": "nominal", "sort": None, "title": None}
+        },
+        "layer": [
+            {"mark": {"type": "arc", "outerRadius": 120}},
+            {"mark": {"type": "text", "radius": 145},
+             "encoding": {"text": {"field": "share", "type": "quantitative", "format": ".1%"}}}
+        ]
+    }
+
+
+def payment_installment_chart(by_payment_installment):
+    # Kept in the order it is given, as the matplotlib version does.
+    data = labels_as_text(with_colors(by_payment_installment, colors_3), "payment_installments")
+    spec = bars("payment_installments", "order_id", horizontal=False)
+    spec["layer"][0]["encoding"]["y"]["title"] = "Total Orders"
+    return data, spec
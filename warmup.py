@@ -0,0 +1,67 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# True on the thread running the boot warm-up. The dashboard then draws every
+# tab, and the result and chart caches pin what it computes, so the default
+# view is never evicted to make room for other ranges.
+active = ContextVar("warmup", default=False)
+
+# Streamlit warns on every call made outside a session, which the warm-up
+# does by design.
+BARE_MODE_LOGGER = "streamlit.runtime.scriptrunner_utils.script_run_context"
+
+
+def outside_warm_up(record):
+    # A logging filter: filters run on the thread that logs.
+    return not active.get()
+
+
+def warm_up(script):
+    # Runs the dashboard once, without a session, so the data, the cube and
+    # RFM index, the default-range results and their figures are all cached
+    # under the same keys the first real session will ask for.
+    token = active.set(True)
+    bare_mode_logger = logging.getLogger(BARE_MODE_LOGGER)
+    bare_mode_logger.addFilter(outside_warm_up)
+    start = time.perf_counter()
+    try:
+        with open(script) as f:
+            code = compile(f.read(), script, "exec")
+        # Streamlit runs the script as __main__ too, and cached functions
+        # are keyed on their module, so the keys match.
+        exec(code, {"__name__": "__main__", "__file__": script})
+    except Exception:
+        logger.exception("warm-up of %s failed", script)
+    else:
+        seconds = time.perf_counter() - start
+        logger.info("warmed up %s in %.1f s", script, seconds)
+        telemetry.record("warmup", "warmup", seconds)
+    finally:
+        bare_mode_logger.removeFilter(outside_warm_up)
+        active.reset(token)
+
+
+def main():
+    # `python warmup.py [streamlit run options]`: the same server as
+    # `streamlit run dashboard.py`, warming up in the background as it starts.
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+    threading.Thread(target=warm_up, args=(script,), name="warmup", daemon=True).start()
+
+    from streamlit.web import cli
+    sys.argv = ["streamlit", "run", script] + sys.argv[1:]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    # Run as a script this file is __main__, while the dashboard imports it as
+    # warmup; hand over to that copy so both see the same flag.
+    import warmup
+    warmup.main()